@@ -0,0 +1,273 @@
+"""Benchmarks for Maze Runners.
+
+Two parts:
+  pure    times the game logic from simulation.py (generate_maze, find_path, generate_items, ...)
+          across SMALL_MAZE_SIZE, MEDIUM_MAZE_SIZE, BOSS_MAZE_SIZE and bigger mazes
+  render  times whole frames (draw_maze, entities, fog, sidebar, display update) headless with
+          SDL_VIDEODRIVER=dummy, on levels built from fixed seeds
+
+Results are machine readable (JSON) and can be checked against a stored baseline:
+
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.25 --threshold-for "render/*=0.5"
+
+The exit code is 1 if any benchmark got slower than its threshold allows (median time).
+"""
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import types
+
+import numpy as np
+
+import levelpack
+import simulation as sim
+
+DEFAULT_SIZES = (sim.SMALL_MAZE_SIZE, sim.MEDIUM_MAZE_SIZE, sim.BOSS_MAZE_SIZE, 201, 1001)
+SEED = 1234
+
+
+def measure(func, repeat, warmup=1):
+    """Runs func() warmup + repeat times, returns the timings of the last repeat runs in ms."""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return times
+
+
+def summarize(times):
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "runs": len(times)}
+
+
+# Part 1: pure functions
+
+def pure_benchmarks(sizes):
+    """(name, func) for every pure function and size. func does its own setup outside of the timing."""
+    for size in sizes:
+        rng = np.random.default_rng((SEED, size))
+        maze = sim.generate_maze(size, size, rng=rng)
+        entrance, exit_cell = sim.add_entrance_exit(maze, rng)
+        dist = sim.compute_distance_field(maze, exit_cell)
+        traps = sim.generate_projectile_traps(maze, 0.3, rng)
+        for algorithm in sim.MAZE_ALGORITHMS:
+            yield (f"pure/generate_maze[{algorithm}]/{size}",
+                   lambda a=algorithm, s=size: sim.generate_maze(s, s, a, np.random.default_rng(SEED)))
+        yield (f"pure/add_entrance_exit/{size}",
+               lambda m=maze: sim.add_entrance_exit(m.copy(), np.random.default_rng(SEED)))
+        yield (f"pure/find_path/{size}", lambda m=maze, e=entrance, x=exit_cell: sim.find_path(m, e, x))
+        yield (f"pure/compute_distance_field/{size}", lambda m=maze, x=exit_cell: sim.compute_distance_field(m, x))
+        yield (f"pure/path_from_distance_field/{size}", lambda d=dist, e=entrance: sim.path_from_distance_field(d, e))
+        arc = sim.ArcLengthPath(sim.path_from_distance_field(dist, entrance))
+        yield (f"pure/ArcLengthPath.at/{size}", lambda a=arc: [a.at(p) for p in (0.1, 0.3, 0.5, 0.7, 0.9)])
+        yield (f"pure/generate_items/{size}",
+               lambda m=maze, e=entrance, x=exit_cell: sim.generate_items(
+                   m, e, x, sim.TRAP_PROBABILITY_BOSS, sim.HEAL_PROBABILITY, np.random.default_rng(SEED)))
+        yield (f"pure/generate_projectile_traps/{size}",
+               lambda m=maze: sim.generate_projectile_traps(m, 0.3, np.random.default_rng(SEED)))
+        yield (f"pure/ProjectileLanes/{size}", lambda m=maze, t=traps: sim.ProjectileLanes(m, t))
+        lanes = sim.ProjectileLanes(maze, traps)
+        yield (f"pure/LineOfSight/{size}", lambda m=maze: sim.LineOfSight(m))
+        yield (f"pure/maze_metrics/{size}",
+               lambda m=maze, e=entrance, x=exit_cell, d=dist, l=lanes: sim.maze_metrics(m, e, x, d, None, l))
+        lanes.update(sim.PROJECTILE_COOLDOWN + 1000)  # every trap fired once
+        yield (f"pure/projectiles_in_view/{size}",
+               lambda l=lanes: (l.positions_in_rect(sim.PROJECTILE_COOLDOWN + 1000, 0, 0, 41, 55),
+                                l.traps_in_rect(0, 0, 41, 55)))
+    for score in (0, 2, 5):
+        size = sim.get_map_settings(score)[0]
+        yield (f"pure/build_level/{size}", lambda s=score: sim.build_level(s, (SEED, s)))
+        record = levelpack.pack_level(sim.build_level(score, (SEED, score)))
+        yield (f"pure/unpack_level/{size}", lambda r=record: levelpack.unpack_level(r))
+    yield (f"pure/build_chunk/{sim.CHUNK_SIZE}", lambda: sim.build_chunk(SEED, 3, -2))
+
+
+# Part 2: frame rendering
+
+RENDER_SCENARIOS = [
+    # (name, score, zoom, fog, moving, scaling, dirty rects)
+    # Without dirty rects every frame gets drawn and flipped; the dirty_* scenarios time draw_frame()
+    # as the game runs it (unchanged frames skipped, only changed rects updated), a different workload.
+    ("small", 0, 1.0, False, True, None, False),
+    ("medium", 2, 1.0, False, True, None, False),
+    ("medium_zoomed", 2, 2.5, False, True, None, False),
+    ("medium_zoomed_nearest", 2, 2.5, False, True, "nearest", False),
+    ("medium_zoomed_smooth", 2, 2.5, False, True, "smooth", False),
+    ("boss", 5, 1.0, False, True, None, False),
+    ("boss_nearest", 5, 1.0, False, True, "nearest", False),
+    ("boss_fog", 5, 1.0, True, True, None, False),
+    ("boss_fog_zoomed", 5, 2.5, True, True, None, False),
+    ("dirty_small", 0, 1.0, False, True, None, True),
+    ("dirty_small_idle", 0, 1.0, False, False, None, True),
+    ("dirty_medium", 2, 1.0, False, True, None, True),
+    ("dirty_boss", 5, 1.0, False, True, None, True),
+]
+
+
+def render_benchmarks(frames):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    import main as game
+
+    pygame.init()
+    screen = pygame.display.set_mode((game.WINDOW_WIDTH, game.WINDOW_HEIGHT))
+    font = game.load_font()
+    moves = list(sim.MOVES.values())
+
+    for name, score, zoom, fog_on, moving, scaling, dirty_rects in RENDER_SCENARIOS:
+        simulation = sim.Simulation(seed=SEED, score=score)
+        simulation.add_health(10**9)  # a benchmark shouldn't die
+        renderer = game.Renderer(screen, font, dirty_rects=dirty_rects, scaling=scaling)
+        walker = random.Random(SEED)
+        state = simulation.state
+        popups = []
+
+        def frame(simulation=simulation, walker=walker, state=state, renderer=renderer, popups=popups,
+                  zoom=zoom, fog_on=fog_on, moving=moving, dirty_rects=dirty_rects):
+            simulation.step(sim.Input(walker.choice(moves) if moving else None), 16)
+            lines = game.hud_lines(state, zoom, False, fog_on)
+            dirty = renderer.draw_frame(state, zoom, popups, lines, False, fog_on)
+            if not dirty_rects:
+                pygame.display.flip()
+            elif dirty:
+                pygame.display.update(dirty)
+
+        size = state.level.maze.shape[0]
+        yield f"render/frame[{name}]/{size}", frame, frames
+
+    # the maze layer on its own, cached and drawn cell by cell
+    level = sim.build_level(5, (SEED, 5))
+    size = level.maze.shape[0]
+    cell_size = min(game.GAME_AREA_WIDTH / size, game.WINDOW_HEIGHT / size)
+    layer = game.MazeLayerCache()
+    for label, cache in (("cached", layer), ("uncached", None)):
+        yield (f"render/draw_maze[{label}]/{size}",
+               lambda c=cache: game.draw_maze(level.maze, screen, cell_size, level.exit_cell, (40.0, 40.0), 1.7, c),
+               frames)
+
+    # the minimap, walking to the exit (a new cell every frame)
+    for size in (sim.BOSS_MAZE_SIZE, 1001):
+        rng = np.random.default_rng((SEED, size))
+        maze = sim.generate_maze(size, size, rng=rng)
+        entrance, exit_cell = sim.add_entrance_exit(maze, rng)
+        walk = itertools.cycle(sim.find_path(maze, entrance, exit_cell))
+        state = types.SimpleNamespace(level=types.SimpleNamespace(maze=maze, exit_cell=exit_cell), player_grid=None)
+        minimap = game.Minimap()
+
+        def frame(state=state, walk=walk, minimap=minimap):
+            state.player_grid = next(walk)
+            minimap.draw(screen, state)
+
+        yield f"render/minimap/{size}", frame, frames
+    pygame.quit()
+
+
+# Baselines
+
+def compare(results, baseline, threshold, overrides):
+    """Returns [(name, baseline ms, current ms, ratio, allowed ratio)] for every benchmark that regressed."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base["median_ms"] <= 0:
+            continue
+        allowed = threshold
+        for pattern, value in overrides:
+            if fnmatch.fnmatch(name, pattern):
+                allowed = value
+        ratio = result["median_ms"] / base["median_ms"]
+        if ratio > 1 + allowed:
+            regressions.append((name, base["median_ms"], result["median_ms"], ratio, 1 + allowed))
+    return regressions
+
+
+def parse_override(text):
+    pattern, _, value = text.rpartition("=")
+    if not pattern:
+        raise argparse.ArgumentTypeError(f"expected PATTERN=THRESHOLD, got {text!r}")
+    return pattern, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maze Runners benchmarks")
+    parser.add_argument("--part", choices=("all", "pure", "render"), default="all")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="maze sizes for the pure benchmarks (odd)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per pure benchmark")
+    parser.add_argument("--frames", type=int, default=120, help="timed frames per render benchmark")
+    parser.add_argument("--filter", default="*", help="only run benchmarks matching this glob")
+    parser.add_argument("--output", help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown of the median before it counts as regression (0.25 = 25%%)")
+    parser.add_argument("--threshold-for", type=parse_override, action="append", default=[],
+                        metavar="PATTERN=THRESHOLD", help="threshold for benchmarks matching a glob")
+    args = parser.parse_args(argv)
+
+    quiet = args.output == "-"
+    jobs = []
+    if args.part in ("all", "pure"):
+        jobs += [(name, func, args.repeat) for name, func in pure_benchmarks(args.sizes)]
+    results = {}
+
+    def run(name, func, repeat):
+        if not fnmatch.fnmatch(name, args.filter):
+            return
+        results[name] = summarize(measure(func, repeat))
+        if not quiet:
+            print(f"{name:50s} {results[name]['median_ms']:10.3f} ms  (min {results[name]['min_ms']:.3f})")
+
+    for job in jobs:
+        run(*job)
+    if args.part in ("all", "render"):
+        for job in render_benchmarks(args.frames):
+            run(*job)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.threshold_for)
+        for name, base, current, ratio, allowed in regressions:
+            print(f"REGRESSION {name}: {base:.3f} ms -> {current:.3f} ms (x{ratio:.2f}, allowed x{allowed:.2f})",
+                  file=sys.stderr)
+        if regressions:
+            return 1
+        if not quiet:
+            print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
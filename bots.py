@@ -0,0 +1,244 @@
+"""Bot players and a headless harness that runs them through many seeded levels in parallel.
+
+Every task is one level (built from the run seed and its score, like in a normal run) played by one bot
+from full health with the normal Simulation rules (traps, crits, healing stations, projectiles) until it
+reaches the exit, dies or runs out of time. Results stream back from the worker processes into a Report
+with deaths, completion times and damage taken per bot and level type, plus the throughput in levels/s
+(per core too).
+
+    python bots.py --levels 500 --bots greedy careful --seed 1
+    python bots.py --levels 500 --set TRAP_PROBABILITY_BOSS=0.08 --set PROJECTILE_COOLDOWN=3000 --output report.json
+    python bots.py --levels 500 --algorithm kruskal
+
+--set changes a gameplay constant of simulation.py in every worker, for tuning experiments.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import simulation as sim
+
+STEP_MS = 16               # simulation step (one frame at 60 fps)
+MAX_LEVEL_TIME = 120_000   # ms a bot gets per level before it counts as timed out
+HEAL_DETOUR = 20           # how far (cells) the careful bot walks out of its way for a healing station
+DODGE_RANGE = 1            # cells around its next cell the careful bot keeps free of projectiles
+
+
+# Bots: get the GameState every step and return the Input for it
+
+class GreedyBot:
+    """Walks the shortest way to the exit, whatever lies on it."""
+
+    def __init__(self):
+        self.level = None
+        self.path = []  # cells still to walk, the next one first
+
+    def act(self, state):
+        if state.level is not self.level:
+            self.level = state.level
+            self.path = []
+        if state.is_animating:
+            return sim.Input()
+        cell = tuple(state.player_grid)
+        while self.path and self.path[0] == cell:
+            self.path.pop(0)
+        if not self.path:
+            self.path = self.plan(state, cell)[1:]
+        if not self.path:
+            return sim.Input()
+        target = self.path[0]
+        if not self.can_step(state, target):
+            return sim.Input()
+        return sim.Input((target[0] - cell[0], target[1] - cell[1]))
+
+    def plan(self, state, cell):
+        """Cells from cell (included) to where the bot wants to go next."""
+        return sim.path_from_distance_field(state.level.exit_distance, cell)
+
+    def can_step(self, state, target):
+        return True
+
+
+class CarefulBot(GreedyBot):
+    """The greedy way, but picks up healing stations it can reach without crossing a trap (at most
+       HEAL_DETOUR cells away) and waits while a projectile is close to its next cell. Levels are perfect
+       mazes, so there is no way around the traps between entrance and exit."""
+
+    def plan(self, state, cell):
+        level = state.level
+        heals = level.items.in_rect(sim.ITEM_HEAL, cell[0] - HEAL_DETOUR, cell[1] - HEAL_DETOUR,
+                                    cell[0] + HEAL_DETOUR + 1, cell[1] + HEAL_DETOUR + 1)
+        if heals:
+            dist = sim.compute_distance_field(level.maze, cell)
+            for d, heal in sorted((dist[heal], heal) for heal in heals):
+                if not 0 < d <= HEAL_DETOUR:
+                    continue
+                path = sim.path_from_distance_field(dist, heal)[::-1]
+                if not any(level.items.has(sim.ITEM_TRAP, c) for c in path[1:]):
+                    return path
+        return super().plan(state, cell)
+
+    def can_step(self, state, target):
+        r, c = target
+        return not state.level.projectile_lanes.positions_in_rect(
+            state.time, r - DODGE_RANGE, c - DODGE_RANGE, r + DODGE_RANGE + 1, c + DODGE_RANGE + 1)
+
+BOTS = {
+    "greedy": GreedyBot,
+    "careful": CarefulBot,
+}
+
+
+def level_kind(settings):
+    w, h, trap_prob, crit_chance, proj_chance, boss = settings
+    if boss:
+        return "boss"
+    return "small" if w == sim.SMALL_MAZE_SIZE else "medium"
+
+
+def play_level(bot_name, run_seed, score, max_time=MAX_LEVEL_TIME, step_ms=STEP_MS, algorithm="backtracker"):
+    """Plays the level for score of the run with a bot, returns what happened as a dict."""
+    simulation = sim.Simulation(seed=run_seed, score=score, advance=False, algorithm=algorithm)
+    state = simulation.state
+    level = state.level
+    bot = BOTS[bot_name]()
+    result = {"bot": bot_name, "score": score, "kind": level_kind(level.settings), "outcome": "timeout",
+              "time_ms": 0, "trap_damage": 0, "projectile_damage": 0, "crits": 0, "healed": 0,
+              "difficulty": level.metrics.difficulty}
+    while state.time < max_time:
+        for event in simulation.step(bot.act(state), step_ms):
+            kind = event[0]
+            if kind == "trap":
+                result["trap_damage"] += event[1]
+                result["crits"] += event[2]
+            elif kind == "projectile_hit":
+                result["projectile_damage"] += event[1]
+            elif kind == "heal":
+                result["healed"] += event[1]
+            elif kind == "level_complete":
+                result["outcome"] = "completed"
+            elif kind == "game_over":
+                result["outcome"] = "died"
+        if result["outcome"] != "timeout":
+            break
+    result["time_ms"] = state.time
+    simulation.close()
+    return result
+
+
+def _play_task(task):
+    return play_level(*task)
+
+
+def _apply_overrides(overrides):
+    """Worker initializer: NAME=value constants of simulation.py."""
+    for name, value in overrides:
+        setattr(sim, name, value)
+
+
+class Report:
+    """Aggregates play_level() results per (bot, level kind) as they come in."""
+
+    def __init__(self):
+        self.groups = {}
+        self.count = 0
+
+    def add(self, result):
+        self.count += 1
+        self.groups.setdefault((result["bot"], result["kind"]), []).append(result)
+
+    def summary(self):
+        rows = []
+        for (bot, kind), results in sorted(self.groups.items()):
+            completed = [r["time_ms"] for r in results if r["outcome"] == "completed"]
+            rows.append({
+                "bot": bot,
+                "kind": kind,
+                "levels": len(results),
+                "deaths": sum(r["outcome"] == "died" for r in results),
+                "timeouts": sum(r["outcome"] == "timeout" for r in results),
+                "death_rate": sum(r["outcome"] == "died" for r in results) / len(results),
+                "median_completion_ms": statistics.median(completed) if completed else None,
+                "mean_trap_damage": statistics.fmean(r["trap_damage"] for r in results),
+                "mean_projectile_damage": statistics.fmean(r["projectile_damage"] for r in results),
+                "mean_healed": statistics.fmean(r["healed"] for r in results),
+                "mean_difficulty": statistics.fmean(r["difficulty"] for r in results),
+            })
+        return rows
+
+    def format(self):
+        lines = [f"{'bot':8s} {'kind':7s} {'levels':>6s} {'deaths':>6s} {'died%':>6s} {'timeout':>7s} "
+                 f"{'median s':>8s} {'trap dmg':>8s} {'proj dmg':>8s} {'healed':>7s} {'diff':>5s}"]
+        for row in self.summary():
+            median = row["median_completion_ms"]
+            lines.append(f"{row['bot']:8s} {row['kind']:7s} {row['levels']:6d} {row['deaths']:6d} "
+                         f"{100 * row['death_rate']:5.1f}% {row['timeouts']:7d} "
+                         f"{'-' if median is None else f'{median / 1000:.1f}':>8s} {row['mean_trap_damage']:8.1f} "
+                         f"{row['mean_projectile_damage']:8.1f} {row['mean_healed']:7.1f} {row['mean_difficulty']:5.1f}")
+        return "\n".join(lines)
+
+
+def parse_override(text):
+    name, _, value = text.partition("=")
+    current = getattr(sim, name, None)
+    if not name.isupper() or not isinstance(current, (int, float)) or isinstance(current, bool):
+        raise argparse.ArgumentTypeError(f"{name!r} is not a numeric constant of simulation.py")
+    try:
+        return name, type(current)(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad value for {name}: {value!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maze Runners bot evaluation")
+    parser.add_argument("--levels", type=int, default=100, help="levels per bot, one per score from --first-score")
+    parser.add_argument("--first-score", type=int, default=0)
+    parser.add_argument("--bots", nargs="+", choices=list(BOTS), default=list(BOTS))
+    parser.add_argument("--seed", type=int, help="run seed (default: a new one)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-time", type=int, default=MAX_LEVEL_TIME, help="ms per level before a timeout")
+    parser.add_argument("--step", type=int, default=STEP_MS, help="simulation step in ms")
+    parser.add_argument("--algorithm", choices=list(sim.MAZE_ALGORITHMS), default="backtracker",
+                        help="maze generator of the levels")
+    parser.add_argument("--set", type=parse_override, action="append", default=[], metavar="NAME=VALUE",
+                        help="override a gameplay constant of simulation.py (e.g. TRAP_PROBABILITY_BOSS=0.08)")
+    parser.add_argument("--output", help="write the report (and every result) as JSON to this file")
+    args = parser.parse_args(argv)
+
+    _apply_overrides(args.set)
+    run_seed = args.seed if args.seed is not None else sim.new_run_seed()
+    tasks = [(bot, run_seed, score, args.max_time, args.step, args.algorithm)
+             for score in range(args.first_score, args.first_score + args.levels) for bot in args.bots]
+    print(f"{len(tasks)} levels (seed {run_seed}) on {args.workers} worker(s)", file=sys.stderr)
+
+    report = Report()
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_apply_overrides, initargs=(args.set,)) as pool:
+        chunksize = max(1, min(16, len(tasks) // (args.workers * 4)))
+        for result in pool.map(_play_task, tasks, chunksize=chunksize):
+            report.add(result)
+            results.append(result)
+            if report.count % 50 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {report.count}/{len(tasks)} levels, {report.count / elapsed:.1f} levels/s", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    throughput = len(tasks) / elapsed if elapsed > 0 else 0.0
+    print(report.format())
+    print(f"\n{len(tasks)} levels in {elapsed:.2f} s: {throughput:.1f} levels/s, "
+          f"{throughput / args.workers:.1f} levels/s per core ({args.workers} worker(s))")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"seed": run_seed, "algorithm": args.algorithm, "overrides": dict(args.set),
+                       "elapsed_s": elapsed, "levels_per_s": throughput, "levels_per_s_per_core": throughput / args.workers,
+                       "summary": report.summary(), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Level packs: many prebuilt levels in one file, loaded through mmap instead of generated at runtime.
+
+File layout (little endian):
+    header   MAGIC, version (u16), level count (u32), index offset (u64)
+    levels   one record per level, see RECORD
+    index    per level: record offset (u64), record length (u32), score (i32)
+
+A record is the RECORD header, the level's MazeMetrics (METRICS), the wall grid as np.packbits(maze == 1),
+then the cells (flat indices r * w + c, u32) of the traps, healing stations and divine powerups, then the
+projectile traps (cell u32 each, followed by their direction codes u8 each, see DIRECTIONS).
+
+    python levelpack.py build levels.mzp --count 1000 --seed 42 --workers 8
+    python levelpack.py build levels.mzp --count 1000 --algorithm kruskal
+    python levelpack.py info levels.mzp
+"""
+import argparse
+import dataclasses
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import simulation as sim
+
+MAGIC = b"MZPK"
+VERSION = 2
+HEADER = struct.Struct("<4sHIQ")        # magic, version, level count, index offset
+INDEX_ENTRY = struct.Struct("<QIi")     # record offset, record length, score
+RECORD = struct.Struct("<iHHHHHHIIII")  # score, h, w, entrance r/c, exit r/c, #traps, #heals, #divine, #projectile traps
+METRICS = struct.Struct("<iIIIIddIIId")  # sim.MazeMetrics fields, in order
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # projectile trap direction codes
+
+
+def _cells(positions, w):
+    return np.array([r * w + c for r, c in positions], dtype="<u4")
+
+
+def pack_level(level):
+    """One level as record bytes."""
+    maze = level.maze
+    h, w = maze.shape
+    items = level.items
+    traps = _cells(items.positions(sim.ITEM_TRAP), w)
+    heals = _cells(items.positions(sim.ITEM_HEAL), w)
+    divine = _cells(items.positions(sim.ITEM_DIVINE), w)
+    proj_cells = _cells([pt["pos"] for pt in level.projectile_traps], w)
+    proj_dirs = np.array([DIRECTIONS.index(tuple(pt["dir"])) for pt in level.projectile_traps], dtype=np.uint8)
+    header = RECORD.pack(level.score, h, w, *level.entrance, *level.exit_cell,
+                         len(traps), len(heals), len(divine), len(proj_cells))
+    metrics = METRICS.pack(*dataclasses.astuple(level.metrics))
+    return b"".join([header, metrics, np.packbits(maze == 1).tobytes(), traps.tobytes(), heals.tobytes(),
+                     divine.tobytes(), proj_cells.tobytes(), proj_dirs.tobytes()])
+
+
+def unpack_level(buffer, offset=0):
+    """Level from the record at offset in buffer (bytes, mmap, ...). The arrays are read straight
+       from the buffer, only the maze gets unpacked into a new array. The metrics come from the record,
+       the rest of the derived data (distance field, projectile lanes, line of sight) on first use."""
+    score, h, w, er, ec, xr, xc, n_traps, n_heals, n_divine, n_proj = RECORD.unpack_from(buffer, offset)
+    offset += RECORD.size
+    metrics = sim.MazeMetrics(*METRICS.unpack_from(buffer, offset))
+    offset += METRICS.size
+    n_bytes = (h * w + 7) // 8
+    bits = np.frombuffer(buffer, dtype=np.uint8, count=n_bytes, offset=offset)
+    maze = np.unpackbits(bits, count=h * w).reshape(h, w).astype(np.int8)
+    offset += n_bytes
+    cells = np.frombuffer(buffer, dtype="<u4", count=n_traps + n_heals + n_divine + n_proj, offset=offset)
+    offset += cells.nbytes
+    proj_dirs = np.frombuffer(buffer, dtype=np.uint8, count=n_proj, offset=offset)
+
+    items = sim.ItemStore(maze.shape)
+    ends = np.cumsum([n_traps, n_heals, n_divine])
+    for kind, part in zip((sim.ITEM_TRAP, sim.ITEM_HEAL, sim.ITEM_DIVINE), np.split(cells[:ends[-1]], ends[:-1])):
+        items.add_many(kind, *np.divmod(part, w))
+    rows, cols = np.divmod(cells[ends[-1]:], w)
+    projectile_traps = [{"pos": (r, c), "dir": DIRECTIONS[d], "last_shot": 0, "cooldown": sim.PROJECTILE_COOLDOWN}
+                        for r, c, d in zip(rows.tolist(), cols.tolist(), proj_dirs.tolist())]
+    level = sim.Level(score, sim.get_map_settings(score), maze, (er, ec), (xr, xc), items, projectile_traps)
+    level.metrics = metrics
+    return level
+
+
+def write_level_pack(path, levels):
+    """Writes the levels (an iterable of Level) as a pack, returns how many were written."""
+    return write_records(path, ((level.score, pack_level(level)) for level in levels))
+
+
+def write_records(path, records):
+    """Writes (score, pack_level() bytes) records as a pack, returns how many were written."""
+    index = []
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))  # filled in at the end
+        for score, record in records:
+            index.append((f.tell(), len(record), score))
+            f.write(record)
+        index_offset = f.tell()
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), index_offset))
+    return len(index)
+
+
+class LevelPack:
+    """A level pack file opened through mmap. pack[i] unpacks the i-th level, level_for(score)
+       the first one stored for that score (None if there is none)."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, index_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a level pack")
+        if version != VERSION:
+            raise ValueError(f"{path} has level pack version {version}, expected {VERSION}")
+        index = np.frombuffer(self._mmap, dtype=[("offset", "<u8"), ("length", "<u4"), ("score", "<i4")],
+                              count=count, offset=index_offset)
+        self._offsets = index["offset"].tolist()
+        self.scores = index["score"].tolist()
+        self._by_score = {}
+        for i, score in enumerate(self.scores):
+            self._by_score.setdefault(score, i)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, i):
+        return unpack_level(self._mmap, self._offsets[i])
+
+    def __contains__(self, score):
+        return score in self._by_score
+
+    def level_for(self, score):
+        i = self._by_score.get(score)
+        return None if i is None else self[i]
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_record(score, run_seed, difficulty_band=None, algorithm="backtracker"):
+    """Builds and packs the level for a score of a run (what the pool workers run)."""
+    return score, pack_level(sim.build_level(score, sim.level_seed(run_seed, score), difficulty_band, algorithm))
+
+
+def build_records(scores, run_seed, workers=1, difficulty_band=None, algorithm="backtracker"):
+    """pack_level() records of the levels for the scores, in order. With workers > 1 they are built in
+       a process pool; every level only depends on (run_seed, score), so they come out the same either way.
+       Workers send back packed bytes, which are much cheaper to pickle than Levels."""
+    scores = list(scores)
+    if workers <= 1:
+        yield from (build_record(score, run_seed, difficulty_band, algorithm) for score in scores)
+        return
+    from concurrent.futures import ProcessPoolExecutor  # multiprocessing is only needed here (keeps main.py startup fast)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, min(64, len(scores) // (workers * 4)))
+        yield from pool.map(build_record, scores, [run_seed] * len(scores), [difficulty_band] * len(scores),
+                            [algorithm] * len(scores), chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maze Runners level packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="generate levels into a pack")
+    build.add_argument("path")
+    build.add_argument("--count", type=int, default=100, help="levels, one per score starting at --first-score")
+    build.add_argument("--first-score", type=int, default=0)
+    build.add_argument("--seed", type=int, help="run seed, the level for a score is built from (seed, score) "
+                                                "like in Simulation(seed=...) (default: a new one)")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes building levels")
+    build.add_argument("--difficulty", type=float, nargs=2, metavar=("MIN", "MAX"),
+                       help="re-roll levels outside this MazeMetrics.difficulty band")
+    build.add_argument("--algorithm", choices=list(sim.MAZE_ALGORITHMS), default="backtracker",
+                       help="maze generator (kruskal is much faster on big mazes)")
+    info = commands.add_parser("info", help="show what a pack holds")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        run_seed = args.seed if args.seed is not None else sim.new_run_seed()
+        scores = range(args.first_score, args.first_score + args.count)
+        start = time.perf_counter()
+        count = write_records(args.path, build_records(scores, run_seed, args.workers, args.difficulty,
+                                                       args.algorithm))
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {count} levels to {args.path} (seed {run_seed}) in {elapsed:.2f} s, "
+              f"{count / elapsed:.1f} levels/s with {args.workers} worker(s)")
+    else:
+        with LevelPack(args.path) as pack:
+            print(f"{args.path}: {len(pack)} levels, scores {min(pack.scores, default='-')}..{max(pack.scores, default='-')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
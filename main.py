@@ -1,12 +1,22 @@
+import time
+IMPORT_START = time.perf_counter()  # for the startup report
 import pygame
 import numpy as np
-import random
+import argparse
 import math
-import noise  # For Perlin noise
-import pygame.gfxdraw  # For anti-aliased filled polygon drawing (used for )
-from collections import deque
+import json
+import dataclasses
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# game logic (level generation, items, projectiles, Simulation) lives in simulation.py, without pygame
+from simulation import (MAX_DIVINE_EYES, ITEM_TRAP, ITEM_HEAL, ITEM_DIVINE, MOVES, MEDIUM_MAZE_SIZE, ENDLESS_LOAD_RADIUS,
+                        MAZE_ALGORITHMS, Input, Simulation, EndlessSimulation, EndlessWorld, clamp, get_map_settings,
+                        is_visible)
+from levelpack import LevelPack
 
 #import pyi_splash  # pyi_splash is used with auto-py2exe to close the splash screen (disabled for testing)
+IMPORT_END = time.perf_counter()
 
 
 WINDOW_WIDTH = 800
@@ -14,13 +24,6 @@ WINDOW_HEIGHT = 600
 SIDEBAR_WIDTH = int(WINDOW_WIDTH * 0.25) 
 GAME_AREA_WIDTH = WINDOW_WIDTH - SIDEBAR_WIDTH
 
-ANIM_DURATION = 200  # in ms
-
-# Maze Size Constants (all must be odd)
-SMALL_MAZE_SIZE = 21  
-MEDIUM_MAZE_SIZE = 41  
-BOSS_MAZE_SIZE = 61 # boss maze when score is a nonzero multiple of 5
-
 # --- COLORS ---
 # Object_Colors
 COLOR_WALL   = (128, 128, 128)
@@ -38,25 +41,6 @@ PROJECTILE_COLOR = (255, 0, 0)  # red (same as trap)
 YELLOW = (255, 255, 0)          # Divine Eyes orb
 LIGHT_GRAY = (200, 200, 200)    # divine path
 
-# --- Gameplay ---
-PLAYER_START_HEALTH = 100
-TRAP_DAMAGE = 20
-HEAL_PROBABILITY = 0.01         # chance a free cell becomes a healing station
-
-TRAP_PROBABILITY_NORMAL = 0.02
-TRAP_PROBABILITY_MEDIUM = 0.035
-TRAP_PROBABILITY_BOSS = 0.05
-
-# only for TRAP, not for PROJECTILE
-NORMAL_CRIT_CHANCE = 0.10
-BOSS_CRIT_CHANCE   = 0.25
-                                # units
-PROJECTILE_COOLDOWN = 5000      # ms
-PROJECTILE_SPEED_FACTOR = 1.5   # cells per second (cells/s)
-
-DIVINE_EYES_SPAWN_CHANCE = 0.001
-MAX_DIVINE_EYES = 2
-
 # FOG the FROG (perlin noise)
 FOG_RADIUS_CELLS = 6                # Fog radius in number of cells
 FOG_NOISE_AMPLITUDE_FACTOR = 0.1    # Noise amplitude as fraction of fog radius (in world units)
@@ -65,181 +49,380 @@ FOG_SPEED = 0.3                     # noise offset speed
 FOG_OPACITY = 255                   # Maximum fog opacity (0-255) (counts as an RGBA value)
 FOG_FADE_WIDTH = 0.5
 FOG_FADE_STEPS = 3                  # Number of concentric fade steps (only works with lower fog opacity)
+FOG_NOISE_POINTS = 60               # points on the fog boundary
+FOG_NOISE_PERIOD = 32               # the precomputed noise table repeats after this much noise offset
+FOG_NOISE_TABLE_STEPS = 640         # table columns per period (linearly interpolated in between)
+
+# Rendering
+MAZE_CACHE_ZOOM_LEVELS = (1.0, 1.5, 2.0, 3.0)  # zoom levels the static maze layer gets pre-rendered at
+WORLD_SCALING = ("nearest", "smooth")          # Renderer scaling modes (None: draw at screen resolution)
+TEXT_CACHE_SIZE = 256                          # rendered text surfaces kept around (least recently used get dropped)
+HUD_TEXT_COLOR = (255, 255, 255)
+MINIMAP_SIZE = 180                             # px, square box at the bottom of the sidebar
+MINIMAP_EXPLORE_RADIUS = 6                     # cells around the player that count as explored (square)
+MINIMAP_UNEXPLORED = (45, 45, 45)
+HUD_FONT = None                                # font file (None: pygame's bundled default font)
+HUD_FONT_SIZE = 24
+HUD_LINE_HEIGHT = 20
+ENDLESS_CELL_SIZE = WINDOW_HEIGHT / MEDIUM_MAZE_SIZE  # endless mode has no maze size to fit
+ENDLESS_CHUNK_LAYERS = (2 * ENDLESS_LOAD_RADIUS + 1) ** 2  # chunk wall layers kept (the chunks that can be on screen)
+
+# Frame profiler (F3: show in sidebar, F4: dump to PROFILE_DUMP_NAME .csv/.json)
+PROFILE_FRAMES = 600                # frames kept in the ring buffer
+PROFILE_STATS_EVERY = 30            # frames between sidebar stat updates
+PROFILE_DUMP_NAME = "frame_profile"
+
+# Fixed timestep: the game logic always advances 1000 / TICK_RATE ms per step, frames interpolate in between
+TICK_RATE = 60                      # logic steps per second
+MAX_TICKS_PER_FRAME = 8             # catch-up limit after a hitch (time beyond that is dropped, the game slows down)
+FRAME_RATE = 60                     # frame cap
+
+STARTUP_BUDGET_MS = 1000            # the startup report warns when getting to the first level takes longer
 
 # Functions (helper functions)
 # These functions are made to be used in the future (for modding or adding new features)
 
-def clamp(val, min_val, max_val):
-    return max(min_val, min(val, max_val))
-
 def world_to_screen(x, y, cam_offset, zoom):
     """Convert world coordinates to screen coordinates using camera offset and zoom."""
     return int((x - cam_offset[0]) * zoom), int((y - cam_offset[1]) * zoom)
 
-def find_path(maze, start, goal):
-    """Simple BFS pathfinding from start to goal in the maze.
-       Returns a list of grid positions (row, col) from start to goal."""
-    queue = deque([start])
-    came_from = {start: None}
-    while queue:
-        current = queue.popleft()
-        if current == goal:
-            break
-        r, c = current
-        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nr, nc = r+dr, c+dc
-            neighbor = (nr, nc)
-            if 0 <= nr < maze.shape[0] and 0 <= nc < maze.shape[1] and maze[nr, nc] == 0:
-                if neighbor not in came_from:
-                    queue.append(neighbor)
-                    came_from[neighbor] = current
-    if goal not in came_from:
-        return []
-    # Reconstruct path
-    path = []
-    cur = goal
-    while cur is not None:
-        path.append(cur)
-        cur = came_from[cur]
-    path.reverse()
-    return path
-
-def interpolate_path(path, progress, cell_size):
-    """Given a list of grid cells (path) and a progress value (0-1),
-       returns a world coordinate (x,y) interpolated along the path."""
-    if not path:
-        return None
-    # Convert grid positions to world coordinates (center of cell)
-    points = [(c * cell_size + cell_size/2, r * cell_size + cell_size/2) for (r, c) in path]
-    total_dist = 0
-    distances = []
-    for i in range(len(points) - 1):
-        d = math.hypot(points[i+1][0]-points[i][0], points[i+1][1]-points[i][1])
-        distances.append(d)
-        total_dist += d
-    target = total_dist * progress
-    acc = 0
-    for i, d in enumerate(distances):
-        if acc + d >= target:
-            seg_progress = (target - acc) / d
-            x = points[i][0] + (points[i+1][0]-points[i][0]) * seg_progress
-            y = points[i][1] + (points[i+1][1]-points[i][1]) * seg_progress
-            return (x, y)
-        acc += d
-    return points[-1]
-
-# Maze + generation
-
-def generate_maze(w, h):
-    maze = np.ones((h, w), dtype=np.int8)
-    start = (1, 1)
-    maze[start] = 0
-    stack = [start]
-    while stack:
-        r, c = stack[-1]
-        neighbors = []
-        for dr, dc in [(-2, 0), (2, 0), (0, -2), (0, 2)]:
-            nr, nc = r + dr, c + dc
-            if 0 < nr < h and 0 < nc < w and maze[nr, nc] == 1:
-                neighbors.append((nr, nc))
-        if neighbors:
-            chosen = random.choice(neighbors)
-            nr, nc = chosen
-            maze[r + (nr - r)//2, c + (nc - c)//2] = 0
-            maze[chosen] = 0
-            stack.append(chosen)
-        else:
-            stack.pop()
-    return maze
+def visible_cells(cam_offset, zoom, cell_size):
+    """Grid rect (r0, c0, r1, c1) covered by the camera, end exclusive."""
+    c0 = int(cam_offset[0] // cell_size)
+    r0 = int(cam_offset[1] // cell_size)
+    c1 = math.ceil((cam_offset[0] + GAME_AREA_WIDTH / zoom) / cell_size) + 1
+    r1 = math.ceil((cam_offset[1] + WINDOW_HEIGHT / zoom) / cell_size) + 1
+    return r0, c0, r1, c1
 
-def add_entrance_exit(maze):
-    h, w = maze.shape
-    possible_cols = [col for col in range(1, w, 2)]
-    top_candidates = [col for col in possible_cols if maze[1, col] == 0]
-    if not top_candidates:
-        top_candidates = possible_cols
-    exit_col = random.choice(top_candidates)
-    bottom_candidates = [col for col in possible_cols if maze[h-2, col] == 0]
-    if not bottom_candidates:
-        bottom_candidates = possible_cols
-    entrance_col = random.choice(bottom_candidates)
-    maze[0, exit_col] = 0
-    maze[h-1, entrance_col] = 0
-    return (h-1, entrance_col), (0, exit_col)
-
-def generate_items(maze, entrance, exit_cell, trap_prob, heal_prob):
-    traps = []
-    healing_stations = []
-    h, w = maze.shape
-    for r in range(h):
-        for c in range(w):
-            if maze[r, c] == 0 and (r, c) not in (entrance, exit_cell):
-                roll = random.random()
-                if roll < trap_prob:
-                    traps.append((r, c))
-                elif roll < trap_prob + heal_prob:
-                    healing_stations.append((r, c))
-    return traps, healing_stations
-
-def generate_projectile_traps(maze, proj_chance):
-    proj_traps = []
-    h, w = maze.shape
-    for r in range(1, h-1):
-        for c in range(1, w-1):
-            if maze[r, c] == 1:
-                for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
-                    nr, nc = r+dr, c+dc
-                    if 0 <= nr < h and 0 <= nc < w and maze[nr, nc] == 0:
-                        nr2, nc2 = r+2*dr, c+2*dc
-                        if 0 <= nr2 < h and 0 <= nc2 < w and maze[nr2, nc2] == 0:
-                            if random.random() < proj_chance:
-                                proj_traps.append({
-                                    "pos": (r, c),
-                                    "dir": (dr, dc),
-                                    "last_shot": 0,
-                                    "cooldown": PROJECTILE_COOLDOWN
-                                })
-                            break
-    return proj_traps
-
-def get_map_settings(score):
-    if score > 0 and score % 5 == 0:
-        size = BOSS_MAZE_SIZE
-        trap_prob = TRAP_PROBABILITY_BOSS
-        crit_chance = BOSS_CRIT_CHANCE
-        boss = True
-    elif score < 2:
-        size = SMALL_MAZE_SIZE
-        trap_prob = TRAP_PROBABILITY_NORMAL
-        crit_chance = NORMAL_CRIT_CHANCE
-        boss = False
-    else:
-        size = MEDIUM_MAZE_SIZE
-        trap_prob = TRAP_PROBABILITY_MEDIUM
-        crit_chance = NORMAL_CRIT_CHANCE
-        boss = False
-    proj_chance = (0.30 if boss else min(0.02 + 0.005 * score, 0.15))
-    return size, size, trap_prob, crit_chance, proj_chance, boss
-
-def is_visible(item_pos, player_pos, maze):
-    pr, pc = player_pos
-    ir, ic = item_pos
-    if pr == ir:
-        step = 1 if ic > pc else -1
-        for c in range(pc+step, ic, step):
-            if maze[pr, c] == 1:
-                return False
-        return True
-    elif pc == ic:
-        step = 1 if ir > pr else -1
-        for r in range(pr+step, ir, step):
-            if maze[r, pc] == 1:
-                return False
-        return True
-    else:
-        return False
+_fonts = {}
+
+def load_font(size=HUD_FONT_SIZE, name=HUD_FONT):
+    """The font, loaded once per (name, size). pygame.font.SysFont() scans all system fonts first
+       (fc-list, the registry, ...), even for the default font, so it isn't used."""
+    font = _fonts.get((name, size))
+    if font is None:
+        font = _fonts[(name, size)] = pygame.font.Font(name, size)
+    return font
+
+class MazeLayerCache:
+    """Pre-rendered wall layer (walls + exit outline) of the current level.
+
+    The layer is rendered once per level and per quantized zoom level (see MAZE_CACHE_ZOOM_LEVELS),
+    then only the visible camera sub-rectangle gets blitted (and scaled, if the zoom is in between levels).
+    Call invalidate() whenever the maze changes (new level). With single_zoom only the layer of the
+    current zoom level is kept (endless mode keeps one cache per chunk)."""
+
+    def __init__(self, single_zoom=False):
+        self.single_zoom = single_zoom
+        self.invalidate()
+
+    def invalidate(self):
+        self._surfaces = {}   # zoom level -> pre-rendered surface
+        self._scratch = None  # reused target for scaled blits
+
+    @staticmethod
+    def quantize_zoom(zoom):
+        for level in MAZE_CACHE_ZOOM_LEVELS:
+            if zoom <= level + 1e-6:
+                return level
+        return MAZE_CACHE_ZOOM_LEVELS[-1]
+
+    def _build(self, maze, cell_size, exit_cell, level):
+        h, w = maze.shape
+        size = (max(1, round(w * cell_size * level)), max(1, round(h * cell_size * level)))
+        # one pixel per cell, then a nearest neighbour upscale (keeps the walls crisp)
+        colors = np.empty((w, h, 3), dtype=np.uint8)
+        colors[:] = COLOR_BG
+        colors[maze.T == 1] = COLOR_WALL
+        surf = pygame.transform.scale(pygame.surfarray.make_surface(colors), size)
+        if pygame.display.get_surface() is not None:
+            surf = surf.convert()
+        if exit_cell is not None:
+            r, c = exit_cell
+            exit_rect = pygame.Rect(int(c * cell_size * level), int(r * cell_size * level),
+                                    math.ceil(cell_size * level), math.ceil(cell_size * level))
+            pygame.draw.rect(surf, (255,255,255), exit_rect, 2)
+        return surf
+
+    def draw(self, maze, screen, cell_size, exit_cell, cam_offset, zoom, view_size=(GAME_AREA_WIDTH, WINDOW_HEIGHT)):
+        level = self.quantize_zoom(zoom)
+        surf = self._surfaces.get(level)
+        if surf is None:
+            if self.single_zoom:
+                self._surfaces.clear()
+            surf = self._surfaces[level] = self._build(maze, cell_size, exit_cell, level)
+        # visible camera window in cache pixels
+        src = pygame.Rect(int(cam_offset[0] * level), int(cam_offset[1] * level),
+                          math.ceil(view_size[0] * level / zoom), math.ceil(view_size[1] * level / zoom))
+        src = src.clip(surf.get_rect())
+        if src.width <= 0 or src.height <= 0:
+            return
+        dest = world_to_screen(src.x / level, src.y / level, cam_offset, zoom)
+        if abs(level - zoom) < 1e-3:
+            screen.blit(surf, dest, src)
+            return
+        size = (math.ceil(src.width * zoom / level), math.ceil(src.height * zoom / level))
+        if self._scratch is None or self._scratch.get_size() != size or self._scratch.get_bitsize() != surf.get_bitsize():
+            self._scratch = pygame.Surface(size, 0, surf)
+        pygame.transform.scale(surf.subsurface(src), size, self._scratch)
+        screen.blit(self._scratch, dest)
+
+class TextCache:
+    """font.render() results keyed on (text, color), with LRU eviction after max_entries."""
+
+    def __init__(self, font, max_entries=TEXT_CACHE_SIZE):
+        self.font = font
+        self.max_entries = max_entries
+        self._surfaces = OrderedDict()
+
+    def render(self, text, color):
+        key = (text, color)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)
+            return surf
+        surf = self._surfaces[key] = self.font.render(text, True, color)
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surf
+
+class SidebarRenderer:
+    """The sidebar is composited into one surface; a line only gets re-rendered when its text changed,
+       so the static lines are drawn once and the rest only when their values change.
+       Only changed lines get blitted to the screen, draw() returns their screen rects."""
+
+    def __init__(self, text_cache, rect=(GAME_AREA_WIDTH, 0, SIDEBAR_WIDTH, WINDOW_HEIGHT)):
+        self.text_cache = text_cache
+        self.rect = pygame.Rect(rect)
+        self._surface = None
+        self._lines = []  # text currently composited per line
+        self._on_screen = False  # the screen shows the composited sidebar
+
+    def invalidate(self):
+        """The screen got overwritten, blit the whole sidebar on the next draw()."""
+        self._on_screen = False
+
+    def _line_rect(self, i):
+        return pygame.Rect(10, 10+i*HUD_LINE_HEIGHT, self.rect.width - 10, HUD_LINE_HEIGHT)
+
+    def draw(self, screen, lines):
+        if self._surface is None:
+            self._surface = pygame.Surface(self.rect.size)
+            self._surface.fill(SIDEBAR_BG)
+        changed = []
+        for i, line in enumerate(lines):
+            if i < len(self._lines) and self._lines[i] == line:
+                continue
+            line_rect = self._line_rect(i)
+            self._surface.fill(SIDEBAR_BG, line_rect)
+            self._surface.blit(self.text_cache.render(line, HUD_TEXT_COLOR), line_rect.topleft)
+            changed.append(line_rect)
+        for i in range(len(lines), len(self._lines)):  # lines that went away
+            self._surface.fill(SIDEBAR_BG, self._line_rect(i))
+            changed.append(self._line_rect(i))
+        self._lines = list(lines)
+        if not self._on_screen:
+            self._on_screen = True
+            screen.blit(self._surface, self.rect)
+            return [self.rect.copy()]
+        for line_rect in changed:
+            screen.blit(self._surface, line_rect.move(self.rect.topleft), line_rect)
+        return [line_rect.move(self.rect.topleft) for line_rect in changed]
+
+def mip_reduce(grid, reduce):
+    """One mip level down: reduce (np.mean, np.max, ...) over 2x2 blocks, odd edges padded by repeating them."""
+    h, w = grid.shape
+    if h % 2 or w % 2:
+        grid = np.pad(grid, ((0, h % 2), (0, w % 2)), mode="edge")
+    return reduce(grid.reshape(grid.shape[0] // 2, 2, grid.shape[1] // 2, 2), axis=(1, 3))
+
+class Minimap:
+    """Overview of the level for the sidebar, only showing the explored cells.
+
+    The walls (wall fraction per texel, np.mean) and the explored mask (np.max) are kept as mip pyramids,
+    down to the first level that fits into MINIMAP_SIZE, which gets drawn at a whole number of pixels
+    per texel. When the player enters a new cell, only the blocks around it get reduced again, level by
+    level, and only their texels get recolored. draw() blits the box only when it changed."""
+
+    def __init__(self, rect=(GAME_AREA_WIDTH + (SIDEBAR_WIDTH - MINIMAP_SIZE) // 2,
+                             WINDOW_HEIGHT - MINIMAP_SIZE - 10, MINIMAP_SIZE, MINIMAP_SIZE)):
+        self.rect = pygame.Rect(rect)
+        self.level = None
+        self._surface = None
+        self._shown = None  # what the box on the screen shows: (level id, player cell, explore count)
+
+    def invalidate(self):
+        self._shown = None
 
-def draw_maze(maze, screen, cell_size, exit_cell, cam_offset, zoom):
+    def set_level(self, level):
+        if level is self.level:
+            return
+        self.level = level
+        self._walls = [(level.maze == 1).astype(np.float32)]
+        self._explored = [np.zeros(level.maze.shape, dtype=bool)]
+        while max(self._walls[-1].shape) > MINIMAP_SIZE:
+            self._walls.append(mip_reduce(self._walls[-1], np.mean))
+            self._explored.append(mip_reduce(self._explored[-1], np.max))
+        h, w = self._walls[-1].shape
+        self.scale = MINIMAP_SIZE // max(h, w)  # pixels per texel
+        self.offset = ((MINIMAP_SIZE - w * self.scale) // 2, (MINIMAP_SIZE - h * self.scale) // 2)
+        if self._surface is None:
+            self._surface = pygame.Surface(self.rect.size)
+        self._surface.fill(SIDEBAR_BG)
+        self._explore_from = None
+        self._updates = 0
+        self._recolor(0, 0, h, w)
+
+    def explore(self, cell):
+        """Marks the cells around cell as explored, updating only the mip blocks they are in."""
+        if cell == self._explore_from:
+            return
+        self._explore_from = cell
+        r, c = cell
+        h, w = self._explored[0].shape
+        r0, c0 = max(r - MINIMAP_EXPLORE_RADIUS, 0), max(c - MINIMAP_EXPLORE_RADIUS, 0)
+        r1, c1 = min(r + MINIMAP_EXPLORE_RADIUS + 1, h), min(c + MINIMAP_EXPLORE_RADIUS + 1, w)
+        if r0 >= r1 or c0 >= c1 or self._explored[0][r0:r1, c0:c1].all():
+            return
+        self._explored[0][r0:r1, c0:c1] = True
+        for k in range(1, len(self._explored)):
+            r0, c0 = r0 // 2, c0 // 2
+            r1, c1 = (r1 + 1) // 2, (c1 + 1) // 2
+            below = self._explored[k - 1]
+            self._explored[k][r0:r1, c0:c1] = mip_reduce(below[2*r0:2*r1, 2*c0:2*c1], np.max)
+        self._updates += 1
+        self._recolor(r0, c0, r1, c1)
+
+    def _recolor(self, r0, c0, r1, c1):
+        """Redraws the texels r0 <= row < r1, c0 <= col < c1 of the shown mip level."""
+        walls = self._walls[-1][r0:r1, c0:c1, None]
+        colors = np.array(COLOR_BG) * (1 - walls) + np.array(COLOR_WALL) * walls
+        colors = np.where(self._explored[-1][r0:r1, c0:c1, None], colors, MINIMAP_UNEXPLORED).astype(np.uint8)
+        scale, (ox, oy) = self.scale, self.offset
+        pixels = pygame.surfarray.pixels3d(self._surface)
+        pixels[ox + c0*scale:ox + c1*scale, oy + r0*scale:oy + r1*scale] = \
+            colors.transpose(1, 0, 2).repeat(scale, axis=0).repeat(scale, axis=1)
+        del pixels  # unlocks the surface
+
+    def _marker(self, cell):
+        k = len(self._walls) - 1
+        scale, (ox, oy) = self.scale, self.offset
+        size = max(scale, 3)
+        return pygame.Rect(self.rect.x + ox + (cell[1] >> k) * scale - (size - scale) // 2,
+                           self.rect.y + oy + (cell[0] >> k) * scale - (size - scale) // 2, size, size)
+
+    def draw(self, screen, state):
+        """Draws the minimap if it changed, returns the screen rects to update."""
+        self.set_level(state.level)
+        cell = tuple(state.player_grid)
+        self.explore(cell)
+        k = len(self._walls) - 1
+        shown = (id(self.level), (cell[0] >> k, cell[1] >> k), self._updates)
+        if shown == self._shown:
+            return []
+        self._shown = shown
+        screen.blit(self._surface, self.rect)
+        exit_cell = self.level.exit_cell
+        if self._explored[0][exit_cell]:
+            pygame.draw.rect(screen, (255,255,255), self._marker(exit_cell), 1)
+        pygame.draw.rect(screen, COLOR_PLAYER, self._marker(cell))
+        return [self.rect.copy()]
+
+def build_fog_noise_table():
+    """pnoise2 along the fog boundary; rows: noise offset (one period), columns: boundary points."""
+    import noise  # Perlin noise, only the boss fog needs it (imported on first use, keeps startup fast)
+    angles = 2 * np.pi * np.arange(FOG_NOISE_POINTS) / FOG_NOISE_POINTS
+    xs, ys = (np.cos(angles) * FOG_NOISE_SCALE).tolist(), (np.sin(angles) * FOG_NOISE_SCALE).tolist()
+    offsets = np.arange(FOG_NOISE_TABLE_STEPS) * (FOG_NOISE_PERIOD / FOG_NOISE_TABLE_STEPS)
+    return np.array([[noise.pnoise2(x + o, y + o, repeatx=FOG_NOISE_PERIOD, repeaty=FOG_NOISE_PERIOD)
+                      for x, y in zip(xs, ys)] for o in offsets.tolist()])
+
+_fog_noise_table = None  # future of build_fog_noise_table(), shared by all FogRenderers
+
+def prepare_fog_noise():
+    """Starts building the fog noise table in a background thread (once), returns its future.
+       The table takes tens of ms, so it shouldn't get built by the first boss frame."""
+    global _fog_noise_table
+    if _fog_noise_table is None:
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fog-noise")
+        _fog_noise_table = executor.submit(build_fog_noise_table)
+        executor.shutdown(wait=False)
+    return _fog_noise_table
+
+class FogRenderer:
+    """Boss level fog: opaque fog with a noisy clear area (plus fade rings) around the player.
+
+    The fog surface is kept across frames and only the bounding box around the last clear area
+    gets refilled and redrawn. The boundary noise comes from a periodic pnoise2 table (see
+    prepare_fog_noise()), so a frame costs a table lookup instead of FOG_NOISE_POINTS noise calls."""
+
+    def __init__(self, size=(GAME_AREA_WIDTH, WINDOW_HEIGHT)):
+        self.size = size
+        self._surface = None
+        self._dirty = None  # area of the surface that isn't plain fog
+        self._table = None
+        angles = 2 * np.pi * np.arange(FOG_NOISE_POINTS) / FOG_NOISE_POINTS
+        self._cos, self._sin = np.cos(angles), np.sin(angles)
+        # every fade ring: (inset, fog alpha inside it); the rings are nested, so they're drawn outside in
+        self._rings = []
+        subtracted = 0
+        for step in range(FOG_FADE_STEPS):
+            fraction = (step+1)/FOG_FADE_STEPS
+            subtract_alpha = int((1-fraction)*FOG_OPACITY)
+            if subtract_alpha > 0 or step == 0:
+                # (the old per-ring gfxdraw polygons got alpha blended onto a transparent surface,
+                # so only alpha*alpha/255 was ever subtracted; kept that way so the fog looks the same)
+                subtracted += subtract_alpha * subtract_alpha // 255
+                self._rings.append((1 - fraction * FOG_FADE_WIDTH, max(FOG_OPACITY - subtracted, 0)))
+
+    def _noise_table(self):
+        if self._table is None:
+            self._table = prepare_fog_noise().result()  # only waits if it was started late (or not at all)
+        return self._table
+
+    def boundary_noise(self, time_offset):
+        table = self._noise_table()
+        pos = (time_offset * FOG_SPEED % FOG_NOISE_PERIOD) / FOG_NOISE_PERIOD * FOG_NOISE_TABLE_STEPS
+        i = int(pos) % FOG_NOISE_TABLE_STEPS
+        f = pos - int(pos)
+        return table[i] * (1 - f) + table[(i + 1) % FOG_NOISE_TABLE_STEPS] * f
+
+    def draw(self, screen, center_world, radius_world, cam_offset, zoom, time_offset):
+        if self._surface is None:
+            self._surface = pygame.Surface(self.size, pygame.SRCALPHA)
+            self._surface.fill((0,0,0, FOG_OPACITY))
+        elif self._dirty is not None:
+            self._surface.fill((0,0,0, FOG_OPACITY), self._dirty)
+        radius = radius_world * (1 + FOG_NOISE_AMPLITUDE_FACTOR * self.boundary_noise(time_offset))
+        cx, cy = center_world
+        bounds = self._surface.get_rect()
+        dirty = None
+        for inset, alpha in self._rings:
+            xs = ((cx + radius * inset * self._cos - cam_offset[0]) * zoom).astype(int)
+            ys = ((cy + radius * inset * self._sin - cam_offset[1]) * zoom).astype(int)
+            if dirty is None:  # outermost ring
+                dirty = pygame.Rect(xs.min(), ys.min(), xs.max() - xs.min() + 1, ys.max() - ys.min() + 1)
+                dirty = dirty.inflate(4, 4).clip(bounds)
+            pygame.draw.polygon(self._surface, (0,0,0, alpha), list(zip(xs.tolist(), ys.tolist())))
+        self._dirty = dirty
+        if FOG_OPACITY == 255:
+            # outside the dirty area the fog is opaque anyway, no need to alpha blend all of it
+            for rect in (pygame.Rect(0, 0, bounds.width, dirty.top),
+                         pygame.Rect(0, dirty.bottom, bounds.width, bounds.height - dirty.bottom),
+                         pygame.Rect(0, dirty.top, dirty.left, dirty.height),
+                         pygame.Rect(dirty.right, dirty.top, bounds.width - dirty.right, dirty.height)):
+                if rect.width > 0 and rect.height > 0:
+                    screen.fill((0,0,0), rect)
+            screen.blit(self._surface, dirty.topleft, dirty)
+        else:
+            screen.blit(self._surface, (0,0))
+
+def draw_maze(maze, screen, cell_size, exit_cell, cam_offset, zoom, layer_cache=None):
+    """Draws the walls and the exit outline. With a MazeLayerCache this is a single (scaled) blit,
+       otherwise every cell gets drawn on its own."""
+    if layer_cache is not None:
+        layer_cache.draw(maze, screen, cell_size, exit_cell, cam_offset, zoom)
+        return
     h, w = maze.shape
     for r in range(h):
         for c in range(w):
@@ -253,14 +436,496 @@ def draw_maze(maze, screen, cell_size, exit_cell, cam_offset, zoom):
             if (r, c) == exit_cell:
                 pygame.draw.rect(screen, (255,255,255), rect, 2)
 
+class StartupTimer:
+    """Startup phases for the report printed once the first level is up: mark(phase) after each
+       one, the first phase starts at IMPORT_START (so it includes the imports)."""
+
+    def __init__(self):
+        self.phases = [("imports", (IMPORT_END - IMPORT_START) * 1000.0)]
+        self._last = IMPORT_END
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000.0))
+        self._last = now
+
+    def total(self):
+        return sum(ms for _, ms in self.phases)
+
+    def report(self):
+        parts = ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in self.phases)
+        over = f" (over the {STARTUP_BUDGET_MS} ms budget)" if self.total() > STARTUP_BUDGET_MS else ""
+        return f"Startup: {parts}; total {self.total():.0f} ms{over}"
+
+def draw_loading(screen, font):
+    """The first frame, shown while the first level gets generated."""
+    screen.fill(COLOR_BG)
+    text = font.render("Generating level...", True, HUD_TEXT_COLOR)
+    screen.blit(text, text.get_rect(center=(GAME_AREA_WIDTH // 2, WINDOW_HEIGHT // 2)))
+    pygame.display.flip()
+
+class FrameProfiler:
+    """Per-phase frame timings in a fixed-size ring buffer.
+
+    Call begin_frame(), then mark(phase) right after each phase (the time since the previous mark
+    is booked on it) and end_frame(). Disabled, every call returns right away."""
+
+    PHASES = ("events", "update", "draw_maze", "entities", "fog", "hud", "flip")
+
+    def __init__(self, capacity=PROFILE_FRAMES):
+        self.enabled = False
+        self._phase_index = {phase: i for i, phase in enumerate(self.PHASES)}
+        self._times = np.zeros((capacity, len(self.PHASES)))  # seconds
+        self._frame_starts = np.zeros(capacity)             # perf_counter() at begin_frame
+        self._index = 0
+        self._count = 0
+        self._last = 0.0
+        self.frame_number = 0  # frames recorded since it was turned on (unlike len(), doesn't stop at capacity)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self._count = self._index = self.frame_number = 0
+        self.begin_frame()  # toggled mid-frame, start timing right away
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._last = time.perf_counter()
+        self._frame_starts[self._index] = self._last
+        self._times[self._index] = 0.0
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._times[self._index, self._phase_index[phase]] += now - self._last
+        self._last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self._index = (self._index + 1) % len(self._times)
+        self._count = min(self._count + 1, len(self._times))
+        self.frame_number += 1
+
+    def __len__(self):
+        return self._count
+
+    def frames(self):
+        """(frame starts, phase times) of the recorded frames, oldest first."""
+        order = (np.arange(self._count) + self._index - self._count) % len(self._times)
+        return self._frame_starts[order], self._times[order]
+
+    def stats(self):
+        """{phase: (p50 ms, p99 ms)}"""
+        if not self._count:
+            return {}
+        times = self.frames()[1] * 1000.0
+        p50, p99 = np.percentile(times, 50, axis=0), np.percentile(times, 99, axis=0)
+        return {phase: (p50[i], p99[i]) for i, phase in enumerate(self.PHASES)}
+
+    def dump_csv(self, path):
+        starts, times = self.frames()
+        with open(path, "w") as f:
+            f.write("frame_start_ms," + ",".join(f"{phase}_ms" for phase in self.PHASES) + "\n")
+            for start, row in zip(starts, times):
+                f.write(f"{start*1000.0:.3f}," + ",".join(f"{t*1000.0:.4f}" for t in row) + "\n")
+
+    def dump_chrome_trace(self, path):
+        """Chrome trace-event JSON (chrome://tracing, Perfetto); phases follow each other in PHASES order."""
+        starts, times = self.frames()
+        events = []
+        for frame, (start, row) in enumerate(zip(starts, times)):
+            ts = start * 1e6
+            for phase, duration in zip(self.PHASES, row):
+                events.append({"name": phase, "ph": "X", "ts": ts, "dur": duration * 1e6,
+                               "pid": 1, "tid": 1, "args": {"frame": frame}})
+                ts += duration * 1e6
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def hud_lines(state, zoom, show_all_traps, fog_on, profile_stats=None, minimap=False):
+    maze_w, maze_h, trap_prob, crit_chance, proj_chance, boss = state.level.settings
+    if isinstance(state.level, EndlessWorld):
+        map_lines = [f"Map: endless {'(boss)' if boss else ''}"]
+    else:
+        map_lines = [f"Map: {maze_w}x{maze_h} {'(boss)' if boss else ''}",
+                     f"Difficulty: {state.level.metrics.difficulty:.1f}"]
+    return [
+        "DEBUG INFO",
+        f"Score: {state.score}",
+        f"Health: {state.health}",
+    ] + map_lines + [
+        f"Zoom: {round(int(zoom*100)/100,1)}",
+        f"Divine Eyes: {state.divine_inventory}/{MAX_DIVINE_EYES}",
+        "",
+        f"divineEyesActive: {state.divine_state if state.divine_state else 'OFF'}",
+        f"showAllTraps: {'ON' if show_all_traps else 'OFF'}",
+        f"noCollision: {'ON' if state.no_collision else 'OFF'}",
+        f"maze_bossFog: {'ON' if fog_on else 'OFF'}",
+        "",
+    ] + (profile_lines(profile_stats) if profile_stats is not None else [
+        # the minimap takes the bottom of the sidebar
+        "P: Divine Eyes",
+        "Z/X: Zoom",
+        "Cheats: T N H L E F O",
+        "F3: Frame Profiler",
+        "M: Hide Minimap",
+    ] if minimap else [
+        "P: Activate Divine Eyes",
+        "Z/X: Zoom In/Out",
+        "",
+        "Cheat Codes:",
+        "T: Toggle Traps",
+        "N: Toggle No Coll",
+        "H: +50 Health",
+        "L: Complete Level",
+        "E: End Game",
+        "F: Toggle Fog",
+        "O: Spawn Divine Eyes",
+        "F3: Frame Profiler",
+        "M: Minimap",
+    ])
+
+def profile_lines(stats):
+    lines = ["Frame (p50 / p99 ms):"]
+    for phase in FrameProfiler.PHASES:
+        p50, p99 = stats.get(phase, (0.0, 0.0))
+        lines.append(f"{phase}: {p50:.2f} / {p99:.2f}")
+    total = sum(p50 for p50, p99 in stats.values())
+    lines += [f"total p50: {total:.2f}", "", "F3: Hide Profiler", "F4: Dump Profile"]
+    return lines
+
+class Renderer:
+    """Draws frames of the game from a simulation GameState. Keeps the per-level caches
+       (maze layer, fog, text) between frames; call set_level() before drawing a new level.
+
+    draw_frame() draws a whole frame and returns the screen rects that changed, for
+    pygame.display.update(). With dirty_rects, a frame that looks like the last one isn't drawn
+    at all, and while the camera stands still only the areas of the moving things get updated.
+
+    With scaling ("nearest" or "smooth", see WORLD_SCALING) the visible part of the world is drawn
+    into an offscreen surface at a whole number of pixels per cell (no seams between cells, nothing
+    to transform per object) and gets scaled to the game area in one go. Fog and popups are drawn
+    on top at screen resolution."""
+
+    def __init__(self, screen, font, profiler=None, dirty_rects=True, scaling=None):
+        if scaling not in (None,) + WORLD_SCALING:
+            raise ValueError(f"Unknown scaling: {scaling!r} (choose from {', '.join(WORLD_SCALING)})")
+        self.screen = screen
+        self.dirty_rects = dirty_rects
+        self.scaling = scaling
+        self.game_rect = pygame.Rect(0, 0, GAME_AREA_WIDTH, WINDOW_HEIGHT)
+        self._last_view = None   # (id(level), cam_offset, zoom, fog) of the last drawn frame
+        self._last_frame = None  # frame_signature() of the last drawn frame
+        self._drawn = []         # screen rects of everything draw_entities() drew
+        self._last_drawn = []
+        self._full_update = True
+        self._sight_from = None  # (level id, player cell) the cached sight is for
+        self._sight = None       # cells visible from there (LineOfSight levels)
+        self._sight_memo = {}    # is_visible results from there (levels without one)
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        self.text_cache = TextCache(font)
+        self.sidebar = SidebarRenderer(self.text_cache)
+        self.minimap = Minimap()
+        self._minimap_shown = False
+        self.maze_layer = MazeLayerCache()  # walls never change within a level, so they only get rendered once
+        self.chunk_layers = OrderedDict()   # endless mode: (cy, cx) -> (chunk, MazeLayerCache), LRU
+        self.fog = FogRenderer()
+        self.level = None
+        self.cell_size = 1.0
+        self.world_cell = 1      # pixels per cell of the offscreen world (scaling only)
+        self._world = None       # offscreen world surface, reused while its size stays the same
+        self._world_scaled = None
+
+    def set_level(self, level):
+        if level is self.level:
+            return
+        self.level = level
+        self.maze_layer.invalidate()
+        self.chunk_layers.clear()
+        if level.settings[5] or get_map_settings(level.score + 1)[5]:  # fog in this or the next level
+            prepare_fog_noise()
+        if isinstance(level, EndlessWorld):
+            self.cell_size = ENDLESS_CELL_SIZE
+        else:
+            maze_h, maze_w = level.maze.shape
+            # Calculate cell size so maze fits within game area
+            self.cell_size = min(GAME_AREA_WIDTH / maze_w, WINDOW_HEIGHT / maze_h)
+        self.world_cell = max(1, round(self.cell_size))  # about 1:1 at zoom 1
+
+    def player_pixel(self, state):
+        return [state.player_pos[0] * self.cell_size, state.player_pos[1] * self.cell_size]
+
+    def camera(self, state, zoom):
+        # Cam calculations (aka: math)
+        cell_size = self.cell_size
+        player_pixel = self.player_pixel(state)
+        player_center = (player_pixel[0] + cell_size/2, player_pixel[1] + cell_size/2)
+        half_view_width_world = GAME_AREA_WIDTH / (2*zoom)
+        half_view_height_world = WINDOW_HEIGHT / (2*zoom)
+        if isinstance(self.level, EndlessWorld):  # no borders to clamp to
+            return (player_center[0] - half_view_width_world, player_center[1] - half_view_height_world)
+        maze_h, maze_w = self.level.maze.shape
+        maze_pixel_width = maze_w * cell_size
+        maze_pixel_height = maze_h * cell_size
+        cam_center_x = clamp(player_center[0], half_view_width_world, maze_pixel_width - half_view_width_world)
+        cam_center_y = clamp(player_center[1], half_view_height_world, maze_pixel_height - half_view_height_world)
+        return (cam_center_x - half_view_width_world, cam_center_y - half_view_height_world)
+
+    def invalidate(self):
+        """Redraw and update the whole window next frame (e.g. after the window got uncovered)."""
+        self._last_frame = None
+        self._full_update = True
+        self.sidebar.invalidate()
+        self.minimap.invalidate()
+
+    def frame_signature(self, state, zoom, cam_offset, popups, show_all_traps, fog_on):
+        """Everything the game area depends on, or None while something in it animates by itself."""
+        if popups or state.divine_state == "animating" or (self.level.settings[5] and fog_on):
+            return None
+        projectiles = tuple(self.level.projectile_lanes.positions_in_rect(
+            state.time, *visible_cells(cam_offset, zoom, self.cell_size)))
+        return (id(self.level), cam_offset, zoom, tuple(state.player_pos), state.divine_state,
+                state.divine_inventory, show_all_traps, fog_on, projectiles)
+
+    def draw_frame(self, state, zoom, popups, lines, show_all_traps=False, fog_on=True, minimap=False):
+        """Draws the game area (if it changed) and the sidebar (with the minimap at its bottom, not in
+           endless mode), returns the screen rects to update."""
+        self.set_level(state.level)
+        cam_offset = self.camera(state, zoom)
+        rects = []
+        signature = self.frame_signature(state, zoom, cam_offset, popups, show_all_traps, fog_on)
+        if not self.dirty_rects or signature is None or signature != self._last_frame:
+            view = (id(self.level), cam_offset, zoom, bool(self.level.settings[5] and fog_on))
+            self.draw(state, zoom, popups, show_all_traps, fog_on)
+            if signature is None or view != self._last_view or not self.dirty_rects or self.scaling:
+                rects.append(self.game_rect.copy())
+            else:  # same view: only where things were and are now
+                rects += [r.clip(self.game_rect) for r in self._last_drawn + self._drawn]
+            self._last_view = view
+            self._last_drawn = self._drawn
+        self._last_frame = signature
+        minimap = minimap and not isinstance(self.level, EndlessWorld)
+        if self._minimap_shown and not minimap:
+            self.sidebar.invalidate()  # blits the plain sidebar over it
+        sidebar_rects = self.draw_sidebar(lines)
+        rects += sidebar_rects
+        if minimap:
+            if not self._minimap_shown or any(r.colliderect(self.minimap.rect) for r in sidebar_rects):
+                self.minimap.invalidate()
+            rects += self.minimap.draw(self.screen, state)
+        self._minimap_shown = minimap
+        if self._full_update:
+            self._full_update = False
+            return [self.screen.get_rect()]
+        return [r for r in rects if r.width > 0 and r.height > 0]
+
+    def draw(self, state, zoom, popups, show_all_traps=False, fog_on=True):
+        """Everything but the sidebar (clipped to the game area, so the sidebar stays as it is)."""
+        self.set_level(state.level)
+        cam_offset = self.camera(state, zoom)
+        self._drawn = []
+        self.screen.set_clip(self.game_rect)
+        if self.scaling:
+            self.draw_world(state, cam_offset, zoom, popups, show_all_traps)
+        else:
+            self.screen.fill(COLOR_BG)
+            if isinstance(self.level, EndlessWorld):
+                self.draw_chunks(self.screen, self.cell_size, cam_offset, zoom, visible_cells(cam_offset, zoom, self.cell_size))
+            else:
+                draw_maze(self.level.maze, self.screen, self.cell_size, self.level.exit_cell, cam_offset, zoom, self.maze_layer)
+            self.profiler.mark("draw_maze")
+            self.draw_entities(state, cam_offset, zoom, popups, show_all_traps)
+            self.profiler.mark("entities")
+        if self.level.settings[5] and fog_on:  # boss level
+            self.draw_fog(state, cam_offset, zoom)
+        self.screen.set_clip(None)
+        self.profiler.mark("fog")
+
+    def draw_world(self, state, cam_offset, zoom, popups, show_all_traps):
+        """scaling: walls and entities of the visible cells at world_cell pixels per cell offscreen,
+           then one scaled blit to the game area (and the popups on top)."""
+        view_cells = visible_cells(cam_offset, zoom, self.cell_size)
+        r0, c0, r1, c1 = view_cells
+        cell = self.world_cell
+        size = ((c1 - c0) * cell, (r1 - r0) * cell)
+        if self._world is None or self._world.get_size() != size:
+            self._world = pygame.Surface(size, 0, self.screen)
+        world = self._world
+        world_cam = (c0 * cell, r0 * cell)  # the offscreen surface starts at cell (r0, c0)
+        world.fill(COLOR_BG)
+        if isinstance(self.level, EndlessWorld):
+            self.draw_chunks(world, cell, world_cam, 1.0, view_cells, size)
+        else:
+            self.maze_layer.draw(self.level.maze, world, cell, self.level.exit_cell, world_cam, 1.0, size)
+        self.profiler.mark("draw_maze")
+        self.draw_entities(state, world_cam, 1.0, [], show_all_traps, world, cell, view_cells)
+        scale = zoom * self.cell_size / cell
+        scaled_size = (math.ceil(size[0] * scale), math.ceil(size[1] * scale))
+        if self._world_scaled is None or self._world_scaled.get_size() != scaled_size:
+            self._world_scaled = pygame.Surface(scaled_size, 0, world)
+        if self.scaling == "smooth":
+            pygame.transform.smoothscale(world, scaled_size, self._world_scaled)
+        else:
+            pygame.transform.scale(world, scaled_size, self._world_scaled)
+        self.screen.blit(self._world_scaled, world_to_screen(c0 * self.cell_size, r0 * self.cell_size, cam_offset, zoom))
+        self.draw_popups(cam_offset, zoom, popups)
+        self.profiler.mark("entities")
+
+    def draw_chunks(self, target, cell_size, cam_offset, zoom, view_cells, view_size=(GAME_AREA_WIDTH, WINDOW_HEIGHT)):
+        """Endless mode: every visible loaded chunk gets its own wall layer, positioned by shifting the camera."""
+        for chunk in self.level.chunks_in_rect(*view_cells):
+            key = (chunk.cy, chunk.cx)
+            entry = self.chunk_layers.get(key)
+            if entry is None or entry[0] is not chunk:  # new, or dropped and rebuilt by the world
+                entry = self.chunk_layers[key] = (chunk, MazeLayerCache(single_zoom=True))
+                if len(self.chunk_layers) > ENDLESS_CHUNK_LAYERS:
+                    self.chunk_layers.popitem(last=False)
+            self.chunk_layers.move_to_end(key)
+            r0, c0 = chunk.origin
+            chunk_cam = (cam_offset[0] - c0 * cell_size, cam_offset[1] - r0 * cell_size)
+            entry[1].draw(chunk.maze, target, cell_size, None, chunk_cam, zoom, view_size)
+
+    def trap_visible(self, pos, state):
+        """is_visible(pos, player cell), cached until the player's cell (or the level) changes."""
+        key = (id(state.level), tuple(state.player_grid))
+        if key != self._sight_from:
+            self._sight_from = key
+            los = state.level.line_of_sight
+            self._sight = los.sight_cells(key[1]) if los is not None else None
+            self._sight_memo = {}
+        if self._sight is not None:
+            return pos in self._sight
+        visible = self._sight_memo.get(pos)
+        if visible is None:
+            visible = self._sight_memo[pos] = is_visible(pos, key[1], state.level.maze)
+        return visible
+
+    def draw_entities(self, state, cam_offset, zoom, popups, show_all_traps, target=None, cell_size=None, view_cells=None):
+        """Items, projectiles, the player, popups and Divine Eyes, on the screen (or onto target,
+           at cell_size pixels per cell, for the cells in view_cells)."""
+        screen = self.screen if target is None else target
+        cell_size = self.cell_size if cell_size is None else cell_size
+        level = state.level
+        drawn = self._drawn  # what got drawn where, for the dirty rects
+        items = level.items
+        player_pixel = [state.player_pos[0] * cell_size, state.player_pos[1] * cell_size]
+        divine_state, divine_path = state.divine_state, state.divine_path
+        if view_cells is None:
+            view_cells = visible_cells(cam_offset, zoom, cell_size)
+        if divine_state == "sustain":
+            # divine_path is kept up to date by the simulation
+            if divine_path:
+                points = [(c*cell_size+cell_size/2, r*cell_size+cell_size/2) for (r,c) in divine_path]
+                # Draw sustained path (line and orbs)
+                if len(points) >= 2:
+                    screen_points = [world_to_screen(x, y, cam_offset, zoom) for (x,y) in points]
+                    drawn.append(pygame.draw.lines(screen, LIGHT_GRAY, False, screen_points, max(1, int(3*zoom))))
+                r0, c0, r1, c1 = view_cells
+                for (r,c), (x,y) in zip(divine_path, points):
+                    if not (r0 <= r < r1 and c0 <= c < c1):
+                        continue
+                    center = world_to_screen(x, y, cam_offset, zoom)
+                    drawn.append(pygame.draw.circle(screen, YELLOW, center, int(cell_size*0.1*zoom)))
+        for dp in items.in_rect(ITEM_DIVINE, *view_cells):  # DRAW DIVINE EYES POWERUPS
+            # Convert grid position to the center of the cell
+            center_world = (dp[1]*cell_size + cell_size/2, dp[0]*cell_size + cell_size/2)
+            center_screen = world_to_screen(center_world[0], center_world[1], cam_offset, zoom)
+            radius = int(cell_size*0.3*zoom)
+            drawn.append(pygame.draw.circle(screen, YELLOW, center_screen, radius))
+        for hs in items.in_rect(ITEM_HEAL, *view_cells):
+            world_x = hs[1]*cell_size
+            world_y = hs[0]*cell_size
+            rect = pygame.Rect(*world_to_screen(world_x, world_y, cam_offset, zoom),
+                               math.ceil(cell_size*zoom),
+                               math.ceil(cell_size*zoom))
+            drawn.append(pygame.draw.rect(screen, COLOR_HEAL, rect))
+        for trap in items.in_rect(ITEM_TRAP, *view_cells):
+            if show_all_traps or self.trap_visible(trap, state):
+                world_x = trap[1]*cell_size
+                world_y = trap[0]*cell_size
+                rect = pygame.Rect(*world_to_screen(world_x, world_y, cam_offset, zoom),
+                                   math.ceil(cell_size*zoom),
+                                   math.ceil(cell_size*zoom))
+                drawn.append(pygame.draw.rect(screen, COLOR_TRAP, rect))
+        # projectile traps and projectiles come from the tiles in view only (spatial buckets)
+        for pt in level.projectile_traps_in_rect(*view_cells):
+            if show_all_traps or self.trap_visible(pt["pos"], state):
+                r, c = pt["pos"]
+                center_world_x = c*cell_size + cell_size/2
+                center_world_y = r*cell_size + cell_size/2
+                center_screen = world_to_screen(center_world_x, center_world_y, cam_offset, zoom)
+                radius = int(cell_size*0.3*zoom)
+                drawn.append(pygame.draw.circle(screen, COLOR_TRAP, center_screen, radius))
+        for proj_x, proj_y in level.projectile_lanes.positions_in_rect(state.time, *view_cells):
+            proj_screen = world_to_screen(proj_x * cell_size, proj_y * cell_size, cam_offset, zoom)
+            radius = int(cell_size*0.1*zoom)
+            drawn.append(pygame.draw.circle(screen, PROJECTILE_COLOR, proj_screen, radius))
+        player_rect = pygame.Rect(*world_to_screen(player_pixel[0], player_pixel[1], cam_offset, zoom),
+                                  math.ceil(cell_size*zoom),
+                                  math.ceil(cell_size*zoom))
+        drawn.append(pygame.draw.rect(screen, COLOR_PLAYER, player_rect))
+        self.draw_popups(cam_offset, zoom, popups)
+
+        # I know it should be an if, else if statement, but this is for render layers. (solution: create a layer-render method; just some more work, yey!)
+        if divine_state == "animating":
+            orb_pos = state.divine_arc.at(state.divine_anim_progress)
+            if orb_pos is not None:
+                orb_pos = (orb_pos[0]*cell_size, orb_pos[1]*cell_size)
+                orb_screen = world_to_screen(orb_pos[0]-cell_size*0.05, orb_pos[1]-cell_size*0.05, cam_offset, zoom)
+                drawn.append(pygame.draw.circle(screen, YELLOW, orb_screen, int(cell_size*0.15*zoom)))
+
+    def draw_popups(self, cam_offset, zoom, popups):
+        for popup in popups:
+            popup_screen = world_to_screen(popup["pos"][0], popup["pos"][1], cam_offset, zoom)
+            popup_surf = self.text_cache.render(popup["text"], popup["color"])
+            self._drawn.append(self.screen.blit(popup_surf, popup_screen))
+
+    def draw_fog(self, state, cam_offset, zoom):
+        # In boss levels, with powerup, you can see a bit more, but never enough >:)
+        cell_size = self.cell_size
+        player_pixel = self.player_pixel(state)
+        fog_radius_world = (FOG_RADIUS_CELLS * cell_size * (1.5 if state.divine_state == "sustain" else 1))
+        player_center_world = (player_pixel[0]+cell_size/2, player_pixel[1]+cell_size/2)
+        self.fog.draw(self.screen, player_center_world, fog_radius_world, cam_offset, zoom, state.time/1000.0)
+
+    def draw_sidebar(self, lines):
+        # My fav thing: SIDEBARS!!!!!
+        return self.sidebar.draw(self.screen, lines)
+
+def snapshot(state):
+    """What interpolated_state() needs from the state before a step."""
+    return state.level, tuple(state.player_pos), state.time, state.divine_anim_progress
+
+def interpolated_state(state, previous, alpha):
+    """Shallow copy of the state for drawing, alpha (0..1) of the way from the snapshot previous to now.
+       A new level or a jump of more than a cell (cheats, endless skips) isn't interpolated."""
+    level, pos, time_before, progress = previous
+    dx, dy = state.player_pos[0] - pos[0], state.player_pos[1] - pos[1]
+    if level is not state.level or abs(dx) + abs(dy) > 1 or alpha >= 1:
+        return state
+    back = 1 - alpha
+    return dataclasses.replace(state, player_pos=[state.player_pos[0] - dx * back, state.player_pos[1] - dy * back],
+                               time=state.time - (state.time - time_before) * back,
+                               divine_anim_progress=state.divine_anim_progress - (state.divine_anim_progress - progress) * back)
+
 # --- Main Game Loop ---
 # finally... right?
-def main():
+def main(endless=False, level_pack=None, seed=None, dirty_rects=True, tick_rate=TICK_RATE, frame_rate=FRAME_RATE,
+         scaling=None, algorithm="backtracker"):
+    startup = StartupTimer()
     pygame.init()
+    startup.mark("pygame.init")
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("Maze Runner v0.0.2") # type.release.patch (type: beta 0/indev -1/release 1+)
     clock = pygame.time.Clock()
-    font = pygame.font.SysFont(None, 24)
+    startup.mark("window")
+    font = load_font()
+    startup.mark("font")
+    draw_loading(screen, font)
+    #pyi_splash.close()
+    startup.mark("first frame")
 
     current_zoom = 1.0
     target_zoom = 1.0
@@ -269,95 +934,78 @@ def main():
     zoom_speed = 0.5  # change per second
     zoom_interp_rate = 5.0
 
-    score = 0
-    player_health = PLAYER_START_HEALTH
-
-    # Debug/Cheat flags
+    # Debug/Cheat flags (noCollision is part of the game state)
     show_all_traps = False
-    no_collision = False
     fog_on = True  # Fog is on by default (applies in boss levels)
+    minimap_on = True
+
+    # The game itself runs in the simulation, this only renders it
+    # (the next level gets built in the background while this one is played)
+    # (endless mode: one borderless maze, generated in chunks around the player;
+    # with a level pack its levels get loaded instead of generated)
+    # The first level gets built in a thread, the window keeps responding meanwhile.
+    def start_simulation():
+        if endless:
+            return EndlessSimulation(seed)
+        return Simulation(seed, prefetch=True, level_pack=LevelPack(level_pack) if level_pack else None,
+                          algorithm=algorithm)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        starting = pool.submit(start_simulation)
+        while not wait([starting], timeout=0.02).done:
+            pygame.event.pump()
+        sim = starting.result()
+    startup.mark("level")
+    print(startup.report())
+    print("Run seed:", sim.seed)  # replay this run with --seed
+    state = sim.state
+    profiler = FrameProfiler()
+    profile_stats = None  # shown in the sidebar while the profiler is on
+    renderer = Renderer(screen, font, profiler, dirty_rects, scaling)
 
-    divine_inventory = 0
-    divine_state = None  # None, "animating", or "sustain"
-    divine_path = []     # List of grid positions for the computed path
-    divine_anim_progress = 0.0
-    divine_anim_duration = 5000  # ms for the animation
-
-    # create maze
-    maze_w, maze_h, trap_prob, crit_chance, proj_chance, boss = get_map_settings(score)
-    maze = generate_maze(maze_w, maze_h)
-    entrance, exit_cell = add_entrance_exit(maze)
-    traps, healing_stations = generate_items(maze, entrance, exit_cell, trap_prob, HEAL_PROBABILITY)
-    projectile_traps = generate_projectile_traps(maze, proj_chance)
-    divine_powerups = []
-    if maze_w == MEDIUM_MAZE_SIZE:
-        for r in range(maze_h):
-            for c in range(maze_w):
-                if maze[r, c] == 0 and (r, c) not in (entrance, exit_cell):
-                    if random.random() < DIVINE_EYES_SPAWN_CHANCE:
-                        divine_powerups.append((r, c))
-    projectiles = []
-
-    # Calculate cell size so maze fits within game area
-    cell_size = min(GAME_AREA_WIDTH / maze_w, WINDOW_HEIGHT / maze_h)
-
-    # Player pos, and world coords
-    player_grid = list(entrance)
-    player_pixel = [player_grid[1] * cell_size, player_grid[0] * cell_size]
-
-    # animation state for movement
-    is_animating = False
-    anim_start_time = 0
-    start_pixel = player_pixel[:]
-    target_grid = player_grid[:]
-    target_pixel = player_pixel[:]
-
-    last_damaged_position = None
     popups = []  # list of dicts: {text, pos, start_time, duration, color}
-    #pyi_splash.close()
+    def add_popup(text, color):
+        renderer.set_level(state.level)
+        popups.append({"text": text, "pos": tuple(renderer.player_pixel(state)),
+                       "start_time": current_time, "duration": 1000, "color": color})
+
+    # Fixed timestep: the logic runs in tick_ms steps, as many as the frame time holds, and the frame
+    # shows the state between the last two steps (so slow frames don't change how the game plays)
+    tick_ms = 1000.0 / tick_rate
+    accumulator = 0.0
+    previous = snapshot(state)
+    previous_zoom = current_zoom
+    activate_divine = False  # until the next step used it
+
+    announced = None  # level the spawn messages were printed for (levels get built in the background)
+
+    clock.tick()  # the loading time isn't game time
     running = True
     while running:
-        dt = clock.tick(60)
+        accumulator += clock.tick(frame_rate)
         current_time = pygame.time.get_ticks()
+        profiler.begin_frame()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.WINDOWEXPOSED:
+                renderer.invalidate()
             elif event.type == pygame.KEYDOWN:
                 # Cheat keybinds:
                 if event.key == pygame.K_t:
                     show_all_traps = not show_all_traps
                     print("Toggled showAllTraps:", show_all_traps)
                 elif event.key == pygame.K_n:
-                    no_collision = not no_collision
-                    print("Toggled noCollision:", no_collision)
+                    state.no_collision = not state.no_collision
+                    print("Toggled noCollision:", state.no_collision)
                 elif event.key == pygame.K_h:
-                    player_health += 50
-                    popups.append({"text": "+50", "pos": (player_pixel[0], player_pixel[1]),
-                                    "start_time": current_time, "duration": 1000, "color": HEAL_TEXT_COLOR})
-                    print("Added 50 health. New Health:", player_health)
+                    sim.add_health(50)
+                    add_popup("+50", HEAL_TEXT_COLOR)
+                    print("Added 50 health. New Health:", state.health)
                 elif event.key == pygame.K_l:
-                    # Complete level cheat: reinitialize level and clear projectiles. (against bugs that happened when using the cheat during testing -> player coords not matching rendering and particles staying)
-                    score += 1
-                    print("Cheat: Level complete! Score:", score)
-                    maze_w, maze_h, trap_prob, crit_chance, proj_chance, boss = get_map_settings(score)
-                    maze = generate_maze(maze_w, maze_h)
-                    entrance, exit_cell = add_entrance_exit(maze)
-                    traps, healing_stations = generate_items(maze, entrance, exit_cell, trap_prob, HEAL_PROBABILITY)
-                    projectile_traps = generate_projectile_traps(maze, proj_chance)
-                    divine_powerups = []
-                    if maze_w == MEDIUM_MAZE_SIZE:
-                        for r in range(maze_h):
-                            for c in range(maze_w):
-                                if maze[r, c] == 0 and (r, c) not in (entrance, exit_cell):
-                                    if random.random() < DIVINE_EYES_SPAWN_CHANCE:
-                                        divine_powerups.append((r, c))
-                    projectiles = []
-                    cell_size = min(GAME_AREA_WIDTH / maze_w, WINDOW_HEIGHT / maze_h)
-                    player_grid = list(entrance)
-                    player_pixel = [player_grid[1] * cell_size, player_grid[0] * cell_size]
-                    last_damaged_position = None
-                    divine_state = None
+                    # Complete level cheat: the simulation reinitializes the level (player, projectiles, ...)
+                    sim.next_level()
+                    print("Cheat: Level complete! Score:", state.score)
                 elif event.key == pygame.K_e:
                     print("Cheat: End Game")
                     running = False
@@ -365,336 +1013,124 @@ def main():
                     fog_on = not fog_on
                     print("Toggled Fog:", fog_on)
                 elif event.key == pygame.K_o:
-                    if divine_inventory < MAX_DIVINE_EYES:
-                        divine_inventory += 1
-                        popups.append({"text": "Divine Eyes +1", "pos": (player_pixel[0], player_pixel[1]),
-                                       "start_time": current_time, "duration": 1000, "color": YELLOW})
-                        print("Cheat: Spawned Divine Eyes. Inventory:", divine_inventory)
+                    if sim.add_divine_eye():
+                        add_popup("Divine Eyes +1", YELLOW)
+                        print("Cheat: Spawned Divine Eyes. Inventory:", state.divine_inventory)
                 elif event.key == pygame.K_p:
-                    if divine_state is None and divine_inventory > 0:
-                        path = find_path(maze, tuple(player_grid), exit_cell)
-                        if path:
-                            divine_inventory -= 1
-                            divine_state = "animating"
-                            divine_anim_progress = 0.0
-                            divine_path = path
-                            popups.append({"text": "Divine Eyes opened", "pos": (player_pixel[0], player_pixel[1]),
-                                           "start_time": current_time, "duration": 1000, "color": YELLOW})
-                            print("Activated Divine Eyes. Inventory left:", divine_inventory)
+                    activate_divine = True
+                elif event.key == pygame.K_m:
+                    minimap_on = not minimap_on
+                    print("Toggled minimap:", minimap_on)
+                elif event.key == pygame.K_F3:
+                    profiler.toggle()
+                    profile_stats = {} if profiler.enabled else None
+                    print("Toggled frame profiler:", profiler.enabled)
+                elif event.key == pygame.K_F4:
+                    profiler.dump_csv(PROFILE_DUMP_NAME + ".csv")
+                    profiler.dump_chrome_trace(PROFILE_DUMP_NAME + ".json")
+                    print(f"Dumped frame profile to {PROFILE_DUMP_NAME}.csv/.json")
+        profiler.mark("events")
 
         keys = pygame.key.get_pressed()
-        if keys[pygame.K_z]:
-            target_zoom = min(target_zoom + zoom_speed * dt / 1000.0, max_zoom)
-        if keys[pygame.K_x]:
-            target_zoom = max(target_zoom - zoom_speed * dt / 1000.0, min_zoom)
-        current_zoom += (target_zoom - current_zoom) * zoom_interp_rate * (dt / 1000.0)
-
-        if not is_animating:
-            new_grid = player_grid.copy()
-            if keys[pygame.K_UP]:
-                new_grid[0] -= 1
-            elif keys[pygame.K_DOWN]:
-                new_grid[0] += 1
-            elif keys[pygame.K_LEFT]:
-                new_grid[1] -= 1
-            elif keys[pygame.K_RIGHT]:
-                new_grid[1] += 1
-            if new_grid != player_grid:
-                if no_collision or (0 <= new_grid[0] < maze_h and 0 <= new_grid[1] < maze_w and maze[new_grid[0], new_grid[1]] == 0):
-                    is_animating = True
-                    anim_start_time = current_time
-                    start_pixel = player_pixel[:]
-                    target_grid = new_grid
-                    target_pixel = [target_grid[1]*cell_size, target_grid[0]*cell_size]
-        if is_animating:
-            t = (current_time - anim_start_time) / ANIM_DURATION
-            if t >= 1:
-                t = 1
-                is_animating = False
-                player_grid = target_grid[:]
-            player_pixel[0] = start_pixel[0] + (target_pixel[0]-start_pixel[0])*t
-            player_pixel[1] = start_pixel[1] + (target_pixel[1]-start_pixel[1])*t
-
-        # collision checks
-        if not is_animating and not no_collision:
-            if tuple(player_grid) in traps:
-                if last_damaged_position != tuple(player_grid):
-                    if random.random() < crit_chance:
-                        extra = int(0.25 * player_health)
-                        damage = TRAP_DAMAGE + extra
-                        popup_text = f"CRIT! -{damage}"
-                        popup_color = GOLD
-                    else:
-                        damage = TRAP_DAMAGE
-                        popup_text = f"-{damage}"
-                        popup_color = ORANGE
-                    player_health -= damage
-                    popups.append({"text": popup_text, "pos": (player_pixel[0], player_pixel[1]),
-                                   "start_time": current_time, "duration": 1000, "color": popup_color})
-                    print("Trap triggered! Damage:", damage, "Health:", player_health)
-                    last_damaged_position = tuple(player_grid)
-            else:
-                last_damaged_position = None
-            if tuple(player_grid) in healing_stations:
-                old_health = player_health
-                player_health = int(player_health + player_health * 0.5)
-                heal_amt = player_health - old_health
-                popups.append({"text": f"+{heal_amt}", "pos": (player_pixel[0], player_pixel[1]),
-                               "start_time": current_time, "duration": 1000, "color": HEAL_TEXT_COLOR})
-                print(f"Healed from {old_health} to {player_health}")
-                healing_stations.remove(tuple(player_grid))
-            # -- experimental (ik it could be optimized, leave me alone mom)
-            if tuple(player_grid) in divine_powerups:
-                if divine_inventory < MAX_DIVINE_EYES:
-                    divine_inventory += 1
-                    popups.append({"text": "Divine Eyes +1", "pos": (player_pixel[0], player_pixel[1]),
-                                   "start_time": current_time, "duration": 1000, "color": YELLOW})
-                    print("Collected Divine Eyes. Inventory:", divine_inventory)
-                divine_powerups.remove(tuple(player_grid))
-
-        # exit check
-        if not is_animating and tuple(player_grid) == exit_cell:
-            score += 1
-            print("Level complete! Score:", score)
-            maze_w, maze_h, trap_prob, crit_chance, proj_chance, boss = get_map_settings(score)
-            maze = generate_maze(maze_w, maze_h)
-            entrance, exit_cell = add_entrance_exit(maze)
-            traps, healing_stations = generate_items(maze, entrance, exit_cell, trap_prob, HEAL_PROBABILITY)
-            projectile_traps = generate_projectile_traps(maze, proj_chance)
-            divine_powerups = []
-            if maze_w == MEDIUM_MAZE_SIZE:
-                for r in range(maze_h):
-                    for c in range(maze_w):
-                        if maze[r, c] == 0 and (r, c) not in (entrance, exit_cell):
-                            if random.random() < DIVINE_EYES_SPAWN_CHANCE:
-                                divine_powerups.append((r, c))
-                                print("devinde_powerup spawned")
-            projectiles = []
-            cell_size = min(GAME_AREA_WIDTH / maze_w, WINDOW_HEIGHT / maze_h)
-            player_grid = list(entrance)
-            player_pixel = [player_grid[1]*cell_size, player_grid[0]*cell_size]
-            last_damaged_position = None
-            divine_state = None
-
-        # Divine Eyes Powerup Logic
-        # If activated, animate the flying orb or "sustain" the effect
-        if divine_state == "animating":
-            divine_anim_progress += dt / divine_anim_duration
-            if divine_anim_progress >= 1.0:
-                divine_anim_progress = 1.0
-                divine_state = "sustain"
-            # Orb position along the precomputed path
-            divine_orb_pos = interpolate_path(divine_path, divine_anim_progress, cell_size)
-        elif divine_state == "sustain":
-            # Continuously update the path from player's grid to exit.
-            new_path = find_path(maze, tuple(player_grid), exit_cell)
-            if new_path:
-                divine_path = new_path
-            # The sustained effect simply draws the path for now... :(
-        
-        # projectile trap logic
-        for pt in projectile_traps:
-            if current_time - pt["last_shot"] >= pt["cooldown"]:
-                r, c = pt["pos"]
-                center_x = c * cell_size + cell_size/2
-                center_y = r * cell_size + cell_size/2
-                dr, dc = pt["dir"]
-                proj_start_x = center_x + dc * (cell_size/2)
-                proj_start_y = center_y + dr * (cell_size/2)
-                projectiles.append({"pos": [proj_start_x, proj_start_y],
-                                    "dir": (dr, dc), "active": False})
-                pt["last_shot"] = current_time
-        for proj in projectiles[:]:
-            projectile_speed = (cell_size * PROJECTILE_SPEED_FACTOR) / 1000
-            proj["pos"][0] += proj["dir"][1] * projectile_speed * dt
-            proj["pos"][1] += proj["dir"][0] * projectile_speed * dt
-            proj_grid_x = int(proj["pos"][0] / cell_size)
-            proj_grid_y = int(proj["pos"][1] / cell_size)
-            if proj_grid_x < 0 or proj_grid_x >= maze_w or proj_grid_y < 0 or proj_grid_y >= maze_h:
-                projectiles.remove(proj)
-                continue
-            if not proj["active"] and maze[proj_grid_y, proj_grid_x] == 0:
-                proj["active"] = True
-            if proj["active"] and maze[proj_grid_y, proj_grid_x] == 1:
-                projectiles.remove(proj)
-                continue
-            if proj["active"]:
-                proj_rect = pygame.Rect(int(proj["pos"][0] - cell_size*0.1),
-                                        int(proj["pos"][1] - cell_size*0.1),
-                                        math.ceil(cell_size*0.2),
-                                        math.ceil(cell_size*0.2))
-                player_rect = pygame.Rect(int(player_pixel[0]), int(player_pixel[1]),
-                                          math.ceil(cell_size), math.ceil(cell_size))
-                if player_rect.colliderect(proj_rect):
-                    player_health -= TRAP_DAMAGE
-                    popups.append({"text": f"-{TRAP_DAMAGE}", "pos": (player_pixel[0], player_pixel[1]),
-                                   "start_time": current_time, "duration": 1000, "color": ORANGE})
-                    print("Projectile hit! Damage:", TRAP_DAMAGE, "Health:", player_health)
-                    projectiles.remove(proj)
-                    continue
-
-        # popup handler (definitly optimized)
-        for popup in popups[:]:
-            if current_time - popup["start_time"] > popup["duration"]:
-                popups.remove(popup)
-            else:
-                popup["pos"] = (popup["pos"][0], popup["pos"][1] - 0.05 * dt)
+        move = None
+        if keys[pygame.K_UP]:
+            move = MOVES["up"]
+        elif keys[pygame.K_DOWN]:
+            move = MOVES["down"]
+        elif keys[pygame.K_LEFT]:
+            move = MOVES["left"]
+        elif keys[pygame.K_RIGHT]:
+            move = MOVES["right"]
 
-        # Cam calculations (aka: math)
-        player_center = (player_pixel[0] + cell_size/2, player_pixel[1] + cell_size/2)
-        maze_pixel_width = maze_w * cell_size
-        maze_pixel_height = maze_h * cell_size
-        half_view_width_world = GAME_AREA_WIDTH / (2*current_zoom)
-        half_view_height_world = WINDOW_HEIGHT / (2*current_zoom)
-        cam_center_x = clamp(player_center[0], half_view_width_world, maze_pixel_width - half_view_width_world)
-        cam_center_y = clamp(player_center[1], half_view_height_world, maze_pixel_height - half_view_height_world)
-        cam_offset = (cam_center_x - half_view_width_world, cam_center_y - half_view_height_world)
+        ticks = 0
+        while accumulator >= tick_ms and not state.game_over:
+            if ticks == MAX_TICKS_PER_FRAME:
+                accumulator = 0.0  # too far behind to catch up
+                break
+            ticks += 1
+            accumulator -= tick_ms
+            previous = snapshot(state)
+            previous_zoom = current_zoom
 
-        # Finally drawing stuff
-        screen.fill(COLOR_BG)
-        draw_maze(maze, screen, cell_size, exit_cell, cam_offset, current_zoom)
-        if divine_state == "sustain":
-            # Recompute path continuously. (optimized, I know)
-            current_path = find_path(maze, tuple(player_grid), exit_cell)
-            if current_path:
-                divine_path = current_path
-                points = [(c*cell_size+cell_size/2, r*cell_size+cell_size/2) for (r,c) in divine_path]
-                # Draw sustained path (line and orbs)
-                if len(points) >= 2:
-                    screen_points = [world_to_screen(x, y, cam_offset, current_zoom) for (x,y) in points]
-                    pygame.draw.lines(screen, LIGHT_GRAY, False, screen_points, max(1, int(3*current_zoom)))
-                for (x,y) in points:
-                    center = world_to_screen(x, y, cam_offset, current_zoom)
-                    pygame.draw.circle(screen, YELLOW, center, int(cell_size*0.1*current_zoom))
-        for dp in divine_powerups:  # DRAW DIVINE EYES POWERUPS
-            # Convert grid position to the center of the cell
-            center_world = (dp[1]*cell_size + cell_size/2, dp[0]*cell_size + cell_size/2)
-            center_screen = world_to_screen(center_world[0], center_world[1], cam_offset, current_zoom)
-            radius = int(cell_size*0.3*current_zoom)
-            pygame.draw.circle(screen, YELLOW, center_screen, radius)
-        for hs in healing_stations:
-            world_x = hs[1]*cell_size
-            world_y = hs[0]*cell_size
-            rect = pygame.Rect(*world_to_screen(world_x, world_y, cam_offset, current_zoom),
-                               math.ceil(cell_size*current_zoom),
-                               math.ceil(cell_size*current_zoom))
-            pygame.draw.rect(screen, COLOR_HEAL, rect)
-        for trap in traps:
-            if show_all_traps or is_visible(trap, tuple(player_grid), maze):
-                world_x = trap[1]*cell_size
-                world_y = trap[0]*cell_size
-                rect = pygame.Rect(*world_to_screen(world_x, world_y, cam_offset, current_zoom),
-                                   math.ceil(cell_size*current_zoom),
-                                   math.ceil(cell_size*current_zoom))
-                pygame.draw.rect(screen, COLOR_TRAP, rect)
-        for pt in projectile_traps:
-            if show_all_traps or is_visible(pt["pos"], tuple(player_grid), maze):
-                r, c = pt["pos"]
-                center_world_x = c*cell_size + cell_size/2
-                center_world_y = r*cell_size + cell_size/2
-                center_screen = world_to_screen(center_world_x, center_world_y, cam_offset, current_zoom)
-                radius = int(cell_size*0.3*current_zoom)
-                pygame.draw.circle(screen, COLOR_TRAP, center_screen, radius)
-        for proj in projectiles:
-            proj_screen = world_to_screen(proj["pos"][0], proj["pos"][1], cam_offset, current_zoom)
-            radius = int(cell_size*0.1*current_zoom)
-            pygame.draw.circle(screen, PROJECTILE_COLOR, proj_screen, radius)
-        player_rect = pygame.Rect(*world_to_screen(player_pixel[0], player_pixel[1], cam_offset, current_zoom),
-                                  math.ceil(cell_size*current_zoom),
-                                  math.ceil(cell_size*current_zoom))
-        pygame.draw.rect(screen, COLOR_PLAYER, player_rect)
-        for popup in popups:
-            popup_screen = world_to_screen(popup["pos"][0], popup["pos"][1], cam_offset, current_zoom)
-            popup_surf = font.render(popup["text"], True, popup["color"])
-            screen.blit(popup_surf, popup_screen)
+            if keys[pygame.K_z]:
+                target_zoom = min(target_zoom + zoom_speed * tick_ms / 1000.0, max_zoom)
+            if keys[pygame.K_x]:
+                target_zoom = max(target_zoom - zoom_speed * tick_ms / 1000.0, min_zoom)
+            current_zoom += (target_zoom - current_zoom) * zoom_interp_rate * (tick_ms / 1000.0)
+            if abs(target_zoom - current_zoom) < 1e-3:
+                current_zoom = target_zoom  # settled, so standing still really is a static frame
 
+            for event in sim.step(Input(move, activate_divine), tick_ms):
+                kind = event[0]
+                if kind == "level_complete":
+                    print("Level complete! Score:", event[1])
+                elif kind == "trap":
+                    damage, crit = event[1], event[2]
+                    add_popup(f"CRIT! -{damage}" if crit else f"-{damage}", GOLD if crit else ORANGE)
+                    print("Trap triggered! Damage:", damage, "Health:", state.health)
+                elif kind == "heal":
+                    add_popup(f"+{event[1]}", HEAL_TEXT_COLOR)
+                    print(f"Healed from {state.health - event[1]} to {state.health}")
+                elif kind == "divine_pickup":
+                    add_popup("Divine Eyes +1", YELLOW)
+                    print("Collected Divine Eyes. Inventory:", state.divine_inventory)
+                elif kind == "divine_activated":
+                    add_popup("Divine Eyes opened", YELLOW)
+                    print("Activated Divine Eyes. Inventory left:", state.divine_inventory)
+                elif kind == "projectile_hit":
+                    add_popup(f"-{event[1]}", ORANGE)
+                    print("Projectile hit! Damage:", event[1], "Health:", state.health)
+            activate_divine = False
 
-        # I know it should be an if, else if statement, but this is for render layers. (solution: create a layer-render method; just some more work, yey!)
-        if divine_state == "animating":
-            orb_pos = interpolate_path(divine_path, divine_anim_progress, cell_size)
-            if orb_pos is not None:
-                orb_screen = world_to_screen(orb_pos[0]-cell_size*0.05, orb_pos[1]-cell_size*0.05, cam_offset, current_zoom)
-                pygame.draw.circle(screen, YELLOW, orb_screen, int(cell_size*0.15*current_zoom))
-
-        # FOG EFFECT DRAWING
-        if boss and fog_on:
-            # In boss levels, with powerup, you can see a bit more, but never enough >:)
-            fog_radius_world = (FOG_RADIUS_CELLS * cell_size * (1.5 if divine_state == "sustain" else 1))
-            num_points = 60
-            time_offset = current_time/1000.0
-            player_center_world = (player_pixel[0]+cell_size/2, player_pixel[1]+cell_size/2)
-            polygon_points_world = []
-            for i in range(num_points):
-                angle = 2*math.pi*i/num_points
-                noise_val = noise.pnoise2(math.cos(angle)*FOG_NOISE_SCALE + time_offset*FOG_SPEED,
-                                           math.sin(angle)*FOG_NOISE_SCALE + time_offset*FOG_SPEED)
-                noise_offset = noise_val * (FOG_NOISE_AMPLITUDE_FACTOR * fog_radius_world)
-                r_val = fog_radius_world + noise_offset
-                x = player_center_world[0] + r_val * math.cos(angle)
-                y = player_center_world[1] + r_val * math.sin(angle)
-                polygon_points_world.append((x,y))
-            fog_surface = pygame.Surface((GAME_AREA_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-            fog_surface.fill((0,0,0, FOG_OPACITY))
-            for step in range(FOG_FADE_STEPS):
-                fraction = (step+1)/FOG_FADE_STEPS
-                inset = 1 - fraction * FOG_FADE_WIDTH
-                clear_poly_world = []
-                for (x,y) in polygon_points_world:
-                    clear_poly_world.append((player_center_world[0] + (x-player_center_world[0])*inset,
-                                               player_center_world[1] + (y-player_center_world[1])*inset))
-                clear_poly_screen = [world_to_screen(x, y, cam_offset, current_zoom) for (x,y) in clear_poly_world]
-                subtract_alpha = int((1-fraction)*FOG_OPACITY)
-                temp_surface = pygame.Surface((GAME_AREA_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-                temp_surface.fill((0,0,0,0))
-                pygame.gfxdraw.filled_polygon(temp_surface, clear_poly_screen, (0,0,0, subtract_alpha))
-                fog_surface.blit(temp_surface, (0,0), special_flags=pygame.BLEND_RGBA_SUB)
-            screen.blit(fog_surface, (0,0))
+            # popup handler (definitly optimized)
+            for popup in popups[:]:
+                if current_time - popup["start_time"] > popup["duration"]:
+                    popups.remove(popup)
+                else:
+                    popup["pos"] = (popup["pos"][0], popup["pos"][1] - 0.05 * tick_ms)
 
-        # My fav thing: SIDEBARS!!!!!
-        sidebar_rect = pygame.Rect(GAME_AREA_WIDTH, 0, SIDEBAR_WIDTH, WINDOW_HEIGHT)
-        pygame.draw.rect(screen, SIDEBAR_BG, sidebar_rect)
-        hud_texts = [
-            "DEBUG INFO",
-            f"Score: {score}",
-            f"Health: {player_health}",
-            f"Map: {maze_w}x{maze_h} {'(boss)' if boss else ''}",
-            f"Zoom: {round(int(current_zoom*100)/100,1)}",
-            f"Divine Eyes: {divine_inventory}/{MAX_DIVINE_EYES}",
-            "",
-            f"divineEyesActive: {divine_state if divine_state else 'OFF'}",
-            f"showAllTraps: {'ON' if show_all_traps else 'OFF'}",
-            f"noCollision: {'ON' if no_collision else 'OFF'}",
-            f"maze_bossFog: {'ON' if fog_on else 'OFF'}",
-            "",
-            "Powerups:",
-            "P: Activate Divine Eyes",
-            "",
-            "Zoom:",
-            "Z: Zoom In",
-            "X: Zoom Out",
-            "",
-            "Cheat Codes:",
-            "T: Toggle Traps",
-            "N: Toggle No Coll",
-            "H: +50 Health",
-            "L: Complete Level",
-            "E: End Game",
-            "F: Toggle Fog",
-            "O: Spawn Divine Eyes",
-            "",
-
-        ]
-        for i, line in enumerate(hud_texts):
-            text_surf = font.render(line, True, (255,255,255))
-            screen.blit(text_surf, (GAME_AREA_WIDTH+10, 10+i*20))
-
-        pygame.display.flip()
-        if player_health <= 0:
-            print("Game Over! Final Score:", score)
+        if state.level is not announced:
+            announced = state.level
+            if not endless:
+                for _ in range(state.level.items.count(ITEM_DIVINE)):
+                    print("devinde_powerup spawned")
+        profiler.mark("update")
+
+        # Finally drawing stuff (only what changed; a frame without changes isn't drawn or shown at all)
+        if profiler.enabled and profiler.frame_number % PROFILE_STATS_EVERY == 0:
+            profile_stats = profiler.stats()
+        alpha = accumulator / tick_ms
+        view = interpolated_state(state, previous, alpha)
+        zoom = previous_zoom + (current_zoom - previous_zoom) * alpha
+        minimap = minimap_on and profile_stats is None and not endless  # the profiler needs the whole sidebar
+        lines = hud_lines(view, zoom, show_all_traps, fog_on, profile_stats, minimap)
+        dirty = renderer.draw_frame(view, zoom, popups, lines, show_all_traps, fog_on, minimap)
+        profiler.mark("hud")
+
+        if dirty:
+            pygame.display.update(dirty)
+        profiler.mark("flip")
+        profiler.end_frame()
+        if state.game_over:
+            print("Game Over! Final Score:", state.score)
             running = False
 
+    sim.close()
     pygame.quit()
 
 if __name__ == "__main__":
     # and now finally, let's start the game!
-    main()
+    parser = argparse.ArgumentParser(description="Maze Runners")
+    parser.add_argument("--endless", action="store_true", help="play one endless maze instead of levels")
+    parser.add_argument("--pack", metavar="FILE", help="load the levels from a level pack (see levelpack.py)")
+    parser.add_argument("--seed", type=int, help="run seed (the same seed gives the same levels)")
+    parser.add_argument("--full-redraw", action="store_true", help="draw and flip every frame (no dirty rects)")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE, help="game logic steps per second")
+    parser.add_argument("--fps", type=int, default=FRAME_RATE, help="frame cap (doesn't change how the game plays)")
+    parser.add_argument("--scaling", choices=WORLD_SCALING,
+                        help="draw the world at whole pixels per cell and scale it to the window in one blit")
+    parser.add_argument("--algorithm", choices=list(MAZE_ALGORITHMS), default="backtracker",
+                        help="maze generator of the levels")
+    args = parser.parse_args()
+    main(endless=args.endless, level_pack=args.pack, seed=args.seed, dirty_rects=not args.full_redraw,
+         tick_rate=args.tick_rate, frame_rate=args.fps, scaling=args.scaling, algorithm=args.algorithm)
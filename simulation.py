@@ -0,0 +1,1321 @@
+"""Game logic of Maze Runners without any pygame: level generation, items, projectiles and the
+Simulation that advances a GameState by a fixed dt from an input vector. main.py only renders it,
+so levels can also be played headless (tests, balancing, load testing)."""
+import numpy as np
+import random
+import math
+import heapq
+import bisect
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
+
+
+ANIM_DURATION = 200  # in ms
+
+# Maze Size Constants (all must be odd)
+SMALL_MAZE_SIZE = 21  
+MEDIUM_MAZE_SIZE = 41  
+BOSS_MAZE_SIZE = 61 # boss maze when score is a nonzero multiple of 5
+
+# --- Gameplay ---
+PLAYER_START_HEALTH = 100
+TRAP_DAMAGE = 20
+HEAL_PROBABILITY = 0.01         # chance a free cell becomes a healing station
+
+TRAP_PROBABILITY_NORMAL = 0.02
+TRAP_PROBABILITY_MEDIUM = 0.035
+TRAP_PROBABILITY_BOSS = 0.05
+
+# only for TRAP, not for PROJECTILE
+NORMAL_CRIT_CHANCE = 0.10
+BOSS_CRIT_CHANCE   = 0.25
+                                # units
+PROJECTILE_COOLDOWN = 5000      # ms
+PROJECTILE_SPEED_FACTOR = 1.5   # cells per second (cells/s)
+
+DIVINE_EYES_SPAWN_CHANCE = 0.001
+MAX_DIVINE_EYES = 2
+
+# --- Endless mode ---
+CHUNK_SIZE = 32             # cells per chunk side (even, so chunks tile the odd cell lattice)
+CHUNK_DOORS = 2             # openings into the chunk above and into the one to the left
+ENDLESS_LOAD_RADIUS = 1     # chunks around the player's chunk that are kept generated
+ENDLESS_MAX_CHUNKS = 25     # generated chunks kept in memory (least recently used get dropped)
+
+# --- Difficulty (see maze_metrics) ---
+DIFFICULTY_DECISION_WEIGHT = 2.0    # per junction on the solution path
+DIFFICULTY_TRAP_WEIGHT = 5.0        # per trap on the solution path
+DIFFICULTY_PROJECTILE_WEIGHT = 1.0  # per solution path cell crossed by a projectile lane
+DIFFICULTY_REROLLS = 8              # extra attempts build_level makes to land in a difficulty band
+
+BUCKET_SIZE = 8  # cells per side of the tiles entities get bucketed by for rect queries (viewport culling)
+
+# Item types (bit flags in the ItemStore grid, so items on the same cell can coexist)
+ITEM_TRAP   = 1
+ITEM_HEAL   = 2
+ITEM_DIVINE = 4
+
+# Functions (helper functions)
+# These functions are made to be used in the future (for modding or adding new features)
+
+def clamp(val, min_val, max_val):
+    return max(min_val, min(val, max_val))
+
+def find_path(maze, start, goal):
+    """Simple BFS pathfinding from start to goal in the maze.
+       Returns a list of grid positions (row, col) from start to goal."""
+    queue = deque([start])
+    came_from = {start: None}
+    while queue:
+        current = queue.popleft()
+        if current == goal:
+            break
+        r, c = current
+        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
+            nr, nc = r+dr, c+dc
+            neighbor = (nr, nc)
+            if 0 <= nr < maze.shape[0] and 0 <= nc < maze.shape[1] and maze[nr, nc] == 0:
+                if neighbor not in came_from:
+                    queue.append(neighbor)
+                    came_from[neighbor] = current
+    if goal not in came_from:
+        return []
+    # Reconstruct path
+    path = []
+    cur = goal
+    while cur is not None:
+        path.append(cur)
+        cur = came_from[cur]
+    path.reverse()
+    return path
+
+def compute_distance_field(maze, goal):
+    """BFS distances (in steps) from goal to every free cell, as an int32 array.
+       Walls and unreachable cells are -1. Computed once per level."""
+    h, w = maze.shape
+    dist = np.full((h, w), -1, dtype=np.int32)
+    gr, gc = goal
+    if not (0 <= gr < h and 0 <= gc < w) or maze[gr, gc] != 0:
+        return dist
+    free = (maze.ravel() == 0).tolist()
+    flat = [-1] * (h * w)
+    start = gr * w + gc
+    flat[start] = 0
+    frontier = [start]
+    d = 0
+    while frontier:
+        d += 1
+        next_frontier = []
+        for i in frontier:
+            c = i % w
+            for n in (i - w, i + w, i - 1 if c > 0 else -1, i + 1 if c < w - 1 else -1):
+                if 0 <= n < h * w and free[n] and flat[n] < 0:
+                    flat[n] = d
+                    next_frontier.append(n)
+        frontier = next_frontier
+    dist.ravel()[:] = flat
+    return dist
+
+def path_from_distance_field(dist, start):
+    """Walks downhill in a distance field from start to its goal (cost ~ path length).
+       Returns a list of grid positions like find_path. A start that can't reach the goal itself
+       (e.g. a wall cell with noCollision) goes through its closest reachable neighbour, if any, else []."""
+    h, w = dist.shape
+    r, c = start
+    if not (0 <= r < h and 0 <= c < w):
+        return []
+    path = [(r, c)]
+    if dist[r, c] < 0:
+        best = None
+        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
+            nr, nc = r+dr, c+dc
+            if 0 <= nr < h and 0 <= nc < w and dist[nr, nc] >= 0:
+                if best is None or dist[nr, nc] < dist[best]:
+                    best = (nr, nc)
+        if best is None:
+            return []
+        r, c = best
+        path.append(best)
+    d = int(dist[r, c])
+    while d > 0:
+        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
+            nr, nc = r+dr, c+dc
+            if 0 <= nr < h and 0 <= nc < w and dist[nr, nc] == d - 1:
+                r, c = nr, nc
+                break
+        path.append((r, c))
+        d -= 1
+    return path
+
+class ArcLengthPath:
+    """A path of grid cells as a polyline through the cell centers (x, y in cells), with the
+       cumulative arc length at every point precomputed once, so a position along it is a binary search."""
+
+    def __init__(self, path):
+        rows, cols = np.asarray(path, dtype=np.float64).reshape(-1, 2).T
+        self.points = np.column_stack([cols + 0.5, rows + 0.5])
+        self.cumulative = np.zeros(len(self.points))
+        np.cumsum(np.hypot(*np.diff(self.points, axis=0).T), out=self.cumulative[1:])
+        self.length = self.cumulative[-1] if len(self.points) else 0.0
+        self._cumulative = self.cumulative.tolist()  # bisect on a list beats numpy for single queries
+
+    def __len__(self):
+        return len(self.points)
+
+    def at(self, progress):
+        """(x, y) at progress (0-1) of the length along the path, None for an empty path."""
+        n = len(self.points)
+        if n == 0:
+            return None
+        target = self.length * progress
+        i = bisect.bisect_left(self._cumulative, target, 1) - 1  # segment i goes from point i to i+1
+        if i >= n - 1:
+            return tuple(self.points[-1].tolist())
+        start, end = self._cumulative[i], self._cumulative[i+1]
+        (x0, y0), (x1, y1) = self.points[i].tolist(), self.points[i+1].tolist()
+        t = (target - start) / (end - start) if end > start else 0.0
+        return (x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+
+    def at_many(self, progresses):
+        """at() for an array of progress values at once, as an (n, 2) array (e.g. for trails)."""
+        progresses = np.asarray(progresses, dtype=np.float64)
+        if len(self.points) < 2:
+            return np.repeat(self.points[-1:], len(progresses), axis=0)
+        target = self.length * progresses
+        i = np.clip(np.searchsorted(self.cumulative, target, side="left") - 1, 0, len(self.points) - 2)
+        start, end = self.cumulative[i], self.cumulative[i+1]
+        t = np.where(end > start, (target - start) / np.where(end > start, end - start, 1.0), 0.0)
+        t = np.where(target > self.length, 1.0, t)
+        return self.points[i] + (self.points[i+1] - self.points[i]) * t[:, None]
+
+def interpolate_path(path, progress, cell_size):
+    """Given a list of grid cells (path) and a progress value (0-1),
+       returns a world coordinate (x,y) interpolated along the path.
+       (Builds an ArcLengthPath every call; keep one around when asking the same path repeatedly.)"""
+    point = ArcLengthPath(path).at(progress) if path else None
+    if point is None:
+        return None
+    return (point[0] * cell_size, point[1] * cell_size)
+
+# Maze + generation
+
+def _maze_backtracker(w, h, rng):
+    """Recursive backtracker on a flat bytearray (cell index = r*w + c, no tuples)."""
+    cells = bytearray(b"\x01") * (w * h)
+    stack = [0] * (w * h // 2 + 2)  # preallocated, never grows
+    start = w + 1  # (1, 1)
+    cells[start] = 0
+    stack[0] = start
+    top = 0
+    rand = random.Random(int(rng.integers(1 << 62))).random  # much cheaper per call than the numpy Generator
+    while top >= 0:
+        i = stack[top]
+        r, c = divmod(i, w)
+        n0 = n1 = n2 = n3 = -1
+        count = 0
+        if r > 2 and cells[i - 2*w]:
+            n0 = i - 2*w; count += 1
+        if r + 2 < h and cells[i + 2*w]:
+            if count == 0: n0 = i + 2*w
+            else: n1 = i + 2*w
+            count += 1
+        if c > 2 and cells[i - 2]:
+            if count == 0: n0 = i - 2
+            elif count == 1: n1 = i - 2
+            else: n2 = i - 2
+            count += 1
+        if c + 2 < w and cells[i + 2]:
+            if count == 0: n0 = i + 2
+            elif count == 1: n1 = i + 2
+            elif count == 2: n2 = i + 2
+            else: n3 = i + 2
+            count += 1
+        if count:
+            k = int(rand() * count)
+            chosen = n0 if k == 0 else n1 if k == 1 else n2 if k == 2 else n3
+            cells[(i + chosen) >> 1] = 0  # wall between i and chosen
+            cells[chosen] = 0
+            top += 1
+            stack[top] = chosen
+        else:
+            top -= 1
+    return np.frombuffer(cells, dtype=np.int8).reshape(h, w).copy()
+
+def _maze_kruskal(w, h, rng):
+    """Randomized Kruskal: the minimum spanning tree of the cell grid under random edge weights.
+       The tree is found Boruvka-style with NumPy (every round, each component takes its cheapest
+       outgoing edge), which gives exactly the tree Kruskal would and needs only O(log cells) rounds."""
+    maze = np.ones((h, w), dtype=np.int8)
+    rows, cols = np.arange(1, h, 2), np.arange(1, w, 2)
+    ch, cw = len(rows), len(cols)
+    if ch == 0 or cw == 0:
+        return maze
+    maze[1::2, 1::2][:ch, :cw] = 0
+    n_cells = ch * cw
+    n_h = ch * (cw - 1)  # horizontal edges first, then the vertical ones
+    node = np.arange(n_cells, dtype=np.int32).reshape(ch, cw)
+    eu = np.concatenate([node[:, :-1].ravel(), node[:-1, :].ravel()])
+    ev = np.concatenate([node[:, 1:].ravel(), node[1:, :].ravel()])
+    n_edges = len(eu)
+    if n_edges == 0:
+        return maze
+    # random weights, made unique (ties would break the tree) by the edge id in the low 32 bits
+    key = rng.integers(0, 1 << 32, n_edges, dtype=np.uint64) << np.uint64(32)
+    key |= np.arange(n_edges, dtype=np.uint64)
+    low, none = np.uint64(0xFFFFFFFF), np.uint64(0xFFFFFFFFFFFFFFFF)
+    chosen = np.zeros(n_edges, dtype=bool)
+    # first round on the grid: every cell takes the cheapest of its (up to 4) edges
+    kh, kv = key[:n_h].reshape(ch, cw - 1), key[n_h:].reshape(ch - 1, cw)
+    best = np.full((ch, cw), none, dtype=np.uint64)
+    best[:, :-1] = kh
+    np.minimum(best[:, 1:], kh, out=best[:, 1:])
+    np.minimum(best[:-1, :], kv, out=best[:-1, :])
+    np.minimum(best[1:, :], kv, out=best[1:, :])
+    comp = np.arange(n_cells, dtype=np.int32)  # component of every cell
+    cu, cv, ek = eu, ev, key  # edges between different components: endpoints (as components) and keys
+    n_comps = n_cells
+    while True:
+        edge = (best.ravel() & low).astype(np.int32)
+        chosen[edge] = True
+        # hook every component onto the one across its cheapest edge, then flatten the trees
+        roots = np.arange(n_comps, dtype=np.int32)
+        u = comp[eu[edge]]
+        parent = np.where(u == roots, comp[ev[edge]], u)
+        mutual = (parent[parent] == roots) & (roots < parent)
+        parent[mutual] = roots[mutual]
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        # contract: relabel the merged components 0..n-1 and drop edges inside them
+        is_root = parent == roots
+        label = (np.cumsum(is_root, dtype=np.int32) - 1)[parent]
+        n_comps = int(is_root.sum())
+        comp = label[comp]
+        cu, cv = label[cu], label[cv]
+        crossing = cu != cv
+        cu, cv, ek = cu[crossing], cv[crossing], ek[crossing]
+        if not len(ek):
+            break
+        best = np.full(n_comps, none, dtype=np.uint64)
+        np.minimum.at(best, cu, ek)
+        np.minimum.at(best, cv, ek)
+    carved = np.flatnonzero(chosen)
+    wall_r = np.concatenate([np.repeat(rows, cw - 1), np.repeat(rows[:-1] + 1, cw)])
+    wall_c = np.concatenate([np.tile(cols[:-1] + 1, ch), np.tile(cols, ch - 1)])
+    maze[wall_r[carved], wall_c[carved]] = 0
+    return maze
+
+MAZE_ALGORITHMS = {
+    "backtracker": _maze_backtracker,  # long winding corridors (the classic look)
+    "kruskal": _maze_kruskal,          # many short dead ends, vectorized (2001x2001 in about half a second)
+}
+
+def generate_maze(w, h, algorithm="backtracker", rng=None):
+    """Perfect maze as an (h, w) int8 grid (1 = wall, 0 = free), cells on odd coordinates.
+       algorithm picks one of MAZE_ALGORITHMS, rng (numpy Generator) makes it reproducible."""
+    if algorithm not in MAZE_ALGORITHMS:
+        raise ValueError(f"Unknown maze algorithm: {algorithm!r} (choose from {', '.join(MAZE_ALGORITHMS)})")
+    if rng is None:
+        rng = np.random.default_rng()
+    return MAZE_ALGORITHMS[algorithm](w, h, rng)
+
+def add_entrance_exit(maze, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    h, w = maze.shape
+    possible_cols = [col for col in range(1, w, 2)]
+    top_candidates = [col for col in possible_cols if maze[1, col] == 0]
+    if not top_candidates:
+        top_candidates = possible_cols
+    exit_col = top_candidates[rng.integers(len(top_candidates))]
+    bottom_candidates = [col for col in possible_cols if maze[h-2, col] == 0]
+    if not bottom_candidates:
+        bottom_candidates = possible_cols
+    entrance_col = bottom_candidates[rng.integers(len(bottom_candidates))]
+    maze[0, exit_col] = 0
+    maze[h-1, entrance_col] = 0
+    return (h-1, entrance_col), (0, exit_col)
+
+class ItemStore:
+    """Items of a level: a uint8 grid of ITEM_* flags for O(1) lookups, plus one array of
+       flat cell indices per item type (swap-removal keeps it compact) for iterating over them.
+       Where a cell sits in that array is kept in a dict, so it only grows with the items."""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.grid = np.zeros(shape, dtype=np.uint8)
+        self._cells = {kind: np.empty(16, dtype=np.int32) for kind in (ITEM_TRAP, ITEM_HEAL, ITEM_DIVINE)}
+        self._slots = {kind: {} for kind in self._cells}  # flat cell index -> position in _cells
+        self._counts = dict.fromkeys(self._cells, 0)
+
+    def _index(self, pos):
+        r, c = pos
+        h, w = self.shape
+        if 0 <= r < h and 0 <= c < w:
+            return r * w + c
+        return -1
+
+    def add(self, kind, pos):
+        i = self._index(pos)
+        if i < 0 or i in self._slots[kind]:
+            return
+        n = self._counts[kind]
+        if n == len(self._cells[kind]):
+            self._cells[kind] = np.resize(self._cells[kind], 2 * n)
+        self._cells[kind][n] = i
+        self._slots[kind][i] = n
+        self._counts[kind] = n + 1
+        self.grid.flat[i] |= kind
+
+    def add_many(self, kind, rows, cols):
+        """Bulk add() for arrays of rows/cols (cells that already hold this kind are skipped)."""
+        h, w = self.shape
+        cells = np.asarray(rows, dtype=np.int32) * w + np.asarray(cols, dtype=np.int32)
+        cells = np.unique(cells[(self.grid.flat[cells] & kind) == 0])
+        n = self._counts[kind]
+        if n + len(cells) > len(self._cells[kind]):
+            self._cells[kind] = np.resize(self._cells[kind], max(2 * n, n + len(cells)))
+        self._cells[kind][n:n + len(cells)] = cells
+        self._slots[kind].update(zip(cells.tolist(), range(n, n + len(cells))))
+        self._counts[kind] = n + len(cells)
+        self.grid.flat[cells] |= kind
+
+    def has(self, kind, pos):
+        i = self._index(pos)
+        return i >= 0 and bool(self.grid.flat[i] & kind)
+
+    def remove(self, kind, pos):
+        i = self._index(pos)
+        if i < 0:
+            return False
+        slot = self._slots[kind].pop(i, None)
+        if slot is None:
+            return False
+        last = self._counts[kind] - 1
+        moved = int(self._cells[kind][last])
+        self._cells[kind][slot] = moved
+        if moved != i:
+            self._slots[kind][moved] = slot
+        self._counts[kind] = last
+        self.grid.flat[i] &= ~kind & 0xFF
+        return True
+
+    def count(self, kind):
+        return self._counts[kind]
+
+    def positions(self, kind):
+        rows, cols = np.divmod(self._cells[kind][:self._counts[kind]], self.shape[1])
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def in_rect(self, kind, r0, c0, r1, c1):
+        """(row, col) of every item of that kind with r0 <= row < r1 and c0 <= col < c1."""
+        h, w = self.shape
+        r0, c0 = max(r0, 0), max(c0, 0)
+        r1, c1 = min(r1, h), min(c1, w)
+        if r0 >= r1 or c0 >= c1:
+            return []
+        rows, cols = np.nonzero(self.grid[r0:r1, c0:c1] & kind)
+        return list(zip((rows + r0).tolist(), (cols + c0).tolist()))
+
+def free_item_cells(maze, entrance, exit_cell):
+    """Boolean mask of the cells items may spawn on (free, not the entrance or exit)."""
+    free = maze == 0
+    for cell in (entrance, exit_cell):
+        if cell is not None:
+            free[cell] = False
+    return free
+
+def generate_items(maze, entrance, exit_cell, trap_prob, heal_prob, rng=None):
+    """One random roll per free cell (drawn in a single batch): below trap_prob it's a trap,
+       below trap_prob + heal_prob a healing station."""
+    if rng is None:
+        rng = np.random.default_rng()
+    items = ItemStore(maze.shape)
+    free = free_item_cells(maze, entrance, exit_cell)
+    roll = rng.random(maze.shape)
+    traps = free & (roll < trap_prob)
+    heals = free & ~traps & (roll < trap_prob + heal_prob)
+    items.add_many(ITEM_TRAP, *np.nonzero(traps))
+    items.add_many(ITEM_HEAL, *np.nonzero(heals))
+    return items
+
+def spawn_divine_powerups(maze, entrance, exit_cell, items, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    spawns = free_item_cells(maze, entrance, exit_cell) & (rng.random(maze.shape) < DIVINE_EYES_SPAWN_CHANCE)
+    rows, cols = np.nonzero(spawns)
+    items.add_many(ITEM_DIVINE, rows, cols)
+
+def generate_projectile_traps(maze, proj_chance, rng=None):
+    """Every inner wall cell looks for the first direction (up, down, left, right) in which the neighbour
+       and the cell behind it are both free, and gets one roll for a projectile trap shooting that way."""
+    if rng is None:
+        rng = np.random.default_rng()
+    h, w = maze.shape
+    free = np.pad(maze == 0, 2, constant_values=False)  # padding = out of bounds
+    candidate = np.zeros((h, w), dtype=bool)
+    candidate[1:h-1, 1:w-1] = maze[1:h-1, 1:w-1] == 1
+    direction = np.full((h, w), -1, dtype=np.int8)
+    dirs = [(-1,0), (1,0), (0,-1), (0,1)]
+    for i, (dr, dc) in enumerate(dirs):
+        ok = candidate & free[2+dr:2+dr+h, 2+dc:2+dc+w] & free[2+2*dr:2+2*dr+h, 2+2*dc:2+2*dc+w]
+        direction[ok & (direction < 0)] = i
+    shoots = (direction >= 0) & (rng.random((h, w)) < proj_chance)
+    rows, cols = np.nonzero(shoots)
+    return [{"pos": (r, c), "dir": dirs[d], "last_shot": 0, "cooldown": PROJECTILE_COOLDOWN}
+            for r, c, d in zip(rows.tolist(), cols.tolist(), direction[rows, cols].tolist())]
+
+class SpatialBuckets:
+    """Ids bucketed by BUCKET_SIZE x BUCKET_SIZE tiles of cells (CSR arrays, row-major tiles), so a rect
+       query only visits the tiles overlapping the rect. An id can sit in several tiles (e.g. a lane)."""
+
+    def __init__(self, shape, rows, cols, ids, size=None):
+        h, w = shape
+        size = BUCKET_SIZE if size is None else size
+        self.size = size
+        self.bh, self.bw = (h + size - 1) // size, (w + size - 1) // size
+        rows, cols, ids = (np.asarray(a, dtype=np.int64) for a in (rows, cols, ids))
+        n_ids = int(ids.max()) + 1 if len(ids) else 1
+        keys = np.unique((rows // size * self.bw + cols // size) * n_ids + ids)  # sorted by tile, no duplicates
+        tiles, self.ids = np.divmod(keys, n_ids)
+        self.start = np.zeros(self.bh * self.bw + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tiles, minlength=self.bh * self.bw), out=self.start[1:])
+
+    def query(self, r0, c0, r1, c1):
+        """Ids in the tiles overlapping r0 <= row < r1, c0 <= col < c1 (unique, maybe a bit outside the rect)."""
+        size = self.size
+        br0, bc0 = max(r0 // size, 0), max(c0 // size, 0)
+        br1, bc1 = min((r1 - 1) // size, self.bh - 1), min((c1 - 1) // size, self.bw - 1)
+        if br0 > br1 or bc0 > bc1:
+            return []
+        # the tiles bc0..bc1 of a tile row are next to each other in the CSR arrays
+        found = [self.ids[self.start[br * self.bw + bc0]:self.start[br * self.bw + bc1 + 1]] for br in range(br0, br1 + 1)]
+        return np.unique(np.concatenate(found)).tolist()
+
+class ProjectileLanes:
+    """All projectiles of a level, computed analytically from their traps' lanes.
+
+    A projectile flies in a straight line from its trap until the first wall, so every trap gets a lane
+    (origin, direction, length in cells) once per level. A projectile is just its spawn time on a lane;
+    its position follows from the time since. Traps fire from a time-ordered schedule (heap), and
+    player collisions only look at the lanes crossing the player's cells. Everything is in cell units."""
+
+    def __init__(self, maze, projectile_traps):
+        h, w = maze.shape
+        self.shape = maze.shape
+        n = len(projectile_traps)
+        self.origin = np.zeros((n, 2), dtype=np.float64)  # trap cell center (x, y)
+        self.direction = np.zeros((n, 2), dtype=np.float64)  # (dx, dy)
+        self.length = np.zeros(n, dtype=np.int32)  # free cells until the first wall
+        lane_cells, lane_ids = [], []
+        for lane, pt in enumerate(projectile_traps):
+            r, c = pt["pos"]
+            dr, dc = pt["dir"]
+            self.origin[lane] = (c + 0.5, r + 0.5)
+            self.direction[lane] = (dc, dr)
+            nr, nc = r + dr, c + dc
+            while 0 <= nr < h and 0 <= nc < w and maze[nr, nc] == 0:
+                lane_cells.append(nr * w + nc)
+                lane_ids.append(lane)
+                nr, nc = nr + dr, nc + dc
+            self.length[lane] = abs(nr - r) + abs(nc - c) - 1
+        # lanes crossing each cell (CSR: lanes of cell i are cell_lanes[cell_start[i]:cell_start[i+1]])
+        lane_cells = np.asarray(lane_cells, dtype=np.int64)
+        # traps (by their cell) and lanes (by every cell they cross) bucketed by tile, for drawing only what's in view
+        trap_cells = np.array([pt["pos"] for pt in projectile_traps], dtype=np.int64).reshape(-1, 2)
+        self.trap_buckets = SpatialBuckets(self.shape, trap_cells[:, 0], trap_cells[:, 1], np.arange(n))
+        lane_rows, lane_cols = np.divmod(lane_cells, w)
+        self.lane_buckets = SpatialBuckets(self.shape, np.concatenate([lane_rows, trap_cells[:, 0]]),
+                                           np.concatenate([lane_cols, trap_cells[:, 1]]),
+                                           np.concatenate([np.asarray(lane_ids, dtype=np.int64), np.arange(n)]))
+        order = np.argsort(lane_cells, kind="stable")
+        self.cell_lanes = np.asarray(lane_ids, dtype=np.int32)[order]
+        self.cell_start = np.zeros(h * w + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lane_cells, minlength=h * w), out=self.cell_start[1:])
+        # a projectile is gone once it entered the wall (or left the maze) at the end of its lane
+        self.lifetime = self.length * 1000.0 / PROJECTILE_SPEED_FACTOR  # ms
+        self.cooldown = [pt["cooldown"] for pt in projectile_traps]
+        self._schedule = [(pt["last_shot"] + pt["cooldown"], lane) for lane, pt in enumerate(projectile_traps)]
+        heapq.heapify(self._schedule)
+        self._expiry = []  # (time, lane) heap
+        self._flying = {}  # lane -> deque of spawn times (oldest first)
+
+    def update(self, now):
+        """Fires every trap that is due and drops projectiles that reached the end of their lane."""
+        schedule = self._schedule
+        while schedule and schedule[0][0] <= now:
+            _, lane = heapq.heappop(schedule)
+            heapq.heappush(schedule, (now + self.cooldown[lane], lane))
+            self._flying.setdefault(lane, deque()).append(now)
+            heapq.heappush(self._expiry, (now + self.lifetime[lane], lane))
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            _, lane = heapq.heappop(expiry)
+            flying = self._flying.get(lane)
+            while flying and now - flying[0] >= self.lifetime[lane]:
+                flying.popleft()
+            if not flying:
+                self._flying.pop(lane, None)
+
+    def _position(self, lane, spawn_time, now):
+        traveled = 0.5 + PROJECTILE_SPEED_FACTOR * (now - spawn_time) / 1000.0
+        ox, oy = self.origin[lane]
+        dx, dy = self.direction[lane]
+        return ox + dx * traveled, oy + dy * traveled
+
+    def collide(self, x, y, now, size=1.0, radius=0.1):
+        """Removes the projectiles (half-size radius) overlapping the square (x, y, size) and returns how many."""
+        h, w = self.shape
+        candidates = set()
+        for r in range(int(math.floor(y)), int(math.floor(y + size - 1e-9)) + 1):
+            for c in range(int(math.floor(x)), int(math.floor(x + size - 1e-9)) + 1):
+                if 0 <= r < h and 0 <= c < w:
+                    i = r * w + c
+                    candidates.update(self.cell_lanes[self.cell_start[i]:self.cell_start[i+1]].tolist())
+        hits = 0
+        for lane in candidates:
+            flying = self._flying.get(lane)
+            if not flying:
+                continue
+            for spawn_time in list(flying):
+                px, py = self._position(lane, spawn_time, now)
+                if x < px + radius and px - radius < x + size and y < py + radius and py - radius < y + size:
+                    flying.remove(spawn_time)
+                    hits += 1
+        return hits
+
+    def positions_in_rect(self, now, r0, c0, r1, c1):
+        """(x, y) of the projectiles in flight within the cells r0 <= row < r1, c0 <= col < c1
+           (with half a cell margin), only looking at the lanes crossing that rect."""
+        found = []
+        for lane in self.lane_buckets.query(r0 - 1, c0 - 1, r1 + 1, c1 + 1):  # the margin can reach a cell further
+            flying = self._flying.get(lane)
+            if not flying:
+                continue
+            for spawn_time in flying:
+                x, y = self._position(lane, spawn_time, now)
+                if c0 - 0.5 <= x < c1 + 0.5 and r0 - 0.5 <= y < r1 + 0.5:
+                    found.append((x, y))
+        return found
+
+    def traps_in_rect(self, r0, c0, r1, c1):
+        """Lanes (= indices into the level's projectile_traps) whose trap is in the rect's tiles."""
+        return self.trap_buckets.query(r0, c0, r1, c1)
+
+# Maze analytics
+
+@dataclass
+class MazeMetrics:
+    """How hard a level is. The maze is looked at as a graph of nodes (junctions, dead ends, entrance
+       and exit) connected by corridors of degree-2 cells. difficulty is
+       (solution_length + weighted decisions, traps and projectile cells on the solution path) / maze width."""
+    solution_length: int        # steps from the entrance to the exit (-1: unreachable)
+    free_cells: int
+    dead_ends: int
+    junctions: int              # cells with 3+ free neighbours
+    corridors: int              # edges of the junction/corridor graph
+    mean_corridor_length: float # cells between two nodes
+    branching_factor: float     # mean number of ways out of a junction
+    decision_points: int        # junctions on the solution path
+    traps_on_path: int
+    projectile_cells_on_path: int
+    difficulty: float
+
+def maze_metrics(maze, entrance, exit_cell, exit_distance=None, items=None, projectile_lanes=None):
+    """MazeMetrics of a level; everything but walking the solution path is vectorized.
+       Pass the level's exit_distance (else it's computed), items and projectile_lanes (else they count as none)."""
+    h, w = maze.shape
+    free = maze == 0
+    padded = np.pad(free, 1, constant_values=False)
+    degree = (padded[:-2, 1:-1].astype(np.int8) + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]) * free
+    ends = np.zeros_like(free)
+    ends[entrance] = ends[exit_cell] = True
+    nodes = free & ((degree != 2) | ends)
+    n_nodes = int(nodes.sum())
+    corridors = int(degree[nodes].sum()) // 2  # every corridor ends in two nodes
+    free_cells = int(free.sum())
+    junction = degree >= 3
+    n_junctions = int(junction.sum())
+
+    if exit_distance is None:
+        exit_distance = compute_distance_field(maze, exit_cell)
+    solution_length = int(exit_distance[entrance])
+    path = path_from_distance_field(exit_distance, entrance) if solution_length >= 0 else []
+    rows, cols = (np.array(path, dtype=np.intp).reshape(-1, 2).T if path else (np.empty(0, np.intp),) * 2)
+    decision_points = int(junction[rows, cols].sum())
+    traps_on_path = 0 if items is None else int((items.grid[rows, cols] & ITEM_TRAP).astype(bool).sum())
+    projectile_cells = 0
+    if projectile_lanes is not None:
+        lanes_per_cell = np.diff(projectile_lanes.cell_start).reshape(h, w)
+        projectile_cells = int((lanes_per_cell[rows, cols] > 0).sum())
+
+    difficulty = (max(solution_length, 0) + DIFFICULTY_DECISION_WEIGHT * decision_points
+                  + DIFFICULTY_TRAP_WEIGHT * traps_on_path + DIFFICULTY_PROJECTILE_WEIGHT * projectile_cells) / w
+    return MazeMetrics(
+        solution_length=solution_length,
+        free_cells=free_cells,
+        dead_ends=int((free & (degree == 1) & ~ends).sum()),
+        junctions=n_junctions,
+        corridors=corridors,
+        mean_corridor_length=(free_cells - n_nodes) / corridors if corridors else 0.0,
+        branching_factor=float(degree[junction].mean()) if n_junctions else 0.0,
+        decision_points=decision_points,
+        traps_on_path=traps_on_path,
+        projectile_cells_on_path=projectile_cells,
+        difficulty=difficulty,
+    )
+
+def get_map_settings(score):
+    if score > 0 and score % 5 == 0:
+        size = BOSS_MAZE_SIZE
+        trap_prob = TRAP_PROBABILITY_BOSS
+        crit_chance = BOSS_CRIT_CHANCE
+        boss = True
+    elif score < 2:
+        size = SMALL_MAZE_SIZE
+        trap_prob = TRAP_PROBABILITY_NORMAL
+        crit_chance = NORMAL_CRIT_CHANCE
+        boss = False
+    else:
+        size = MEDIUM_MAZE_SIZE
+        trap_prob = TRAP_PROBABILITY_MEDIUM
+        crit_chance = NORMAL_CRIT_CHANCE
+        boss = False
+    proj_chance = (0.30 if boss else min(0.02 + 0.005 * score, 0.15))
+    return size, size, trap_prob, crit_chance, proj_chance, boss
+
+@dataclass
+class Level:
+    """Everything a level needs, so a prepared level can be handed over in one piece.
+       What is derived from the maze gets computed on first use, prepare() does it all right away."""
+    score: int
+    settings: tuple  # get_map_settings(score)
+    maze: np.ndarray
+    entrance: tuple
+    exit_cell: tuple
+    items: ItemStore  # traps, healing stations and divine powerups
+    projectile_traps: list = field(default_factory=list)
+
+    @cached_property
+    def exit_distance(self):
+        """compute_distance_field(maze, exit_cell), used by Divine Eyes."""
+        return compute_distance_field(self.maze, self.exit_cell)
+
+    @cached_property
+    def projectile_lanes(self):
+        return ProjectileLanes(self.maze, self.projectile_traps)
+
+    @cached_property
+    def metrics(self):
+        return maze_metrics(self.maze, self.entrance, self.exit_cell, self.exit_distance, self.items,
+                            self.projectile_lanes)
+
+    @cached_property
+    def line_of_sight(self):
+        """Trap visibility."""
+        return LineOfSight(self.maze)
+
+    def prepare(self):
+        """Computes the derived data now (e.g. in a worker thread) instead of while the level is played."""
+        self.metrics, self.line_of_sight
+        return self
+
+    def is_free(self, r, c):
+        h, w = self.maze.shape
+        return 0 <= r < h and 0 <= c < w and self.maze[r, c] == 0
+
+    def projectile_traps_in_rect(self, r0, c0, r1, c1):
+        return [self.projectile_traps[lane] for lane in self.projectile_lanes.traps_in_rect(r0, c0, r1, c1)]
+
+def new_run_seed():
+    """A fresh random run seed (an int, so it can be printed and passed in again)."""
+    return int(np.random.default_rng().integers(1 << 62))
+
+def level_seed(run_seed, score):
+    """Seed of the level for a score in a run: levels of a run don't depend on each other,
+       so any of them can be rebuilt on its own (or in another process)."""
+    return (run_seed, score)
+
+def build_level(score, seed=None, difficulty_band=None, algorithm="backtracker"):
+    """Builds a whole level. The same seed (anything np.random.default_rng takes) gives the same level;
+       settings come from get_map_settings(score), all randomness from one Generator seeded with it,
+       the maze from the MAZE_ALGORITHMS entry algorithm.
+       With a difficulty_band (min, max) of MazeMetrics.difficulty, levels outside of it get re-rolled
+       (up to DIFFICULTY_REROLLS times, from seeds spawned off the seed); if none fits, the closest one is used."""
+    if difficulty_band is None:
+        return _generate_level(score, np.random.default_rng(seed), algorithm)
+    low, high = difficulty_band
+    seeds = [seed] + np.random.SeedSequence(seed).spawn(DIFFICULTY_REROLLS)
+    best, best_miss = None, None
+    for attempt_seed in seeds:
+        level = _generate_level(score, np.random.default_rng(attempt_seed), algorithm)
+        miss = max(low - level.metrics.difficulty, level.metrics.difficulty - high, 0.0)
+        if miss == 0.0:
+            return level
+        if best is None or miss < best_miss:
+            best, best_miss = level, miss
+    return best
+
+def _generate_level(score, rng, algorithm="backtracker"):
+    settings = get_map_settings(score)
+    maze_w, maze_h, trap_prob, crit_chance, proj_chance, boss = settings
+    maze = generate_maze(maze_w, maze_h, algorithm, rng)
+    entrance, exit_cell = add_entrance_exit(maze, rng)
+    items = generate_items(maze, entrance, exit_cell, trap_prob, HEAL_PROBABILITY, rng)
+    projectile_traps = generate_projectile_traps(maze, proj_chance, rng)
+    if maze_w == MEDIUM_MAZE_SIZE:
+        spawn_divine_powerups(maze, entrance, exit_cell, items, rng)
+    return Level(score, settings, maze, entrance, exit_cell, items, projectile_traps).prepare()
+
+class LevelPrefetcher:
+    """Builds the next level in a worker thread while the current one is played (or loads it from the
+       level_pack, if that holds the score). take() hands over the prepared level, waiting for the worker
+       if it is still building it (building it again next to the running worker would only be slower);
+       other scores get built right away."""
+
+    def __init__(self, difficulty_band=None, algorithm="backtracker", level_pack=None):
+        self.difficulty_band = difficulty_band  # see build_level
+        self.algorithm = algorithm
+        self.level_pack = level_pack
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+        self._score = None
+        self._future = None
+
+    def request(self, score, seed=None):
+        if self._future is not None and self._score == score:
+            return
+        self._discard()
+        self._score = score
+        self._future = self._executor.submit(self._load, score, seed)
+
+    def take(self, score, seed=None):
+        future, prefetched_score = self._future, self._score
+        self._future = self._score = None
+        if future is not None and prefetched_score == score:
+            try:
+                return future.result()
+            except Exception as e:
+                print("Level prefetch failed, generating now:", e)
+        elif future is not None:
+            future.cancel()
+        return self._load(score, seed)
+
+    def _load(self, score, seed):
+        if self.level_pack is not None and score in self.level_pack:
+            return self.level_pack.level_for(score).prepare()
+        return build_level(score, seed, self.difficulty_band, self.algorithm)
+
+    def _discard(self):
+        if self._future is not None:
+            self._future.cancel()
+        self._future = self._score = None
+
+    def shutdown(self):
+        self._discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Endless mode
+
+@dataclass
+class Chunk:
+    """CHUNK_SIZE x CHUNK_SIZE cells of the endless maze, starting at world cell (cy, cx) * CHUNK_SIZE.
+       maze, items and projectile_lanes use chunk-local cells, projectile_traps world cells."""
+    cy: int
+    cx: int
+    settings: tuple  # get_map_settings(ring)
+    maze: np.ndarray
+    items: ItemStore
+    projectile_traps: list
+    projectile_lanes: ProjectileLanes
+
+    @property
+    def origin(self):
+        return self.cy * CHUNK_SIZE, self.cx * CHUNK_SIZE
+
+def chunk_ring(cy, cx):
+    """Difficulty of a chunk: its distance in chunks from the start chunk (used as score)."""
+    return max(abs(cy), abs(cx))
+
+def build_chunk(seed, cy, cx, now=0, start=None):
+    """Builds chunk (cy, cx) of the endless maze from (seed, cy, cx), so it comes out the same whenever
+       it's needed again. Every chunk is a perfect maze; its top row and left column are the walls it shares
+       with the chunks above and to the left, and get CHUNK_DOORS openings each, which keeps the whole world
+       connected. Projectile lanes end at the chunk border. start (local cell) is kept free of items."""
+    rng = np.random.default_rng((seed, cy % 2**32, cx % 2**32))
+    settings = get_map_settings(chunk_ring(cy, cx))
+    maze_w, maze_h, trap_prob, crit_chance, proj_chance, boss = settings
+    # the last row/column of a CHUNK_SIZE+1 maze is the next chunk's first one, so it's cut off
+    maze = generate_maze(CHUNK_SIZE + 1, CHUNK_SIZE + 1, rng=rng)[:CHUNK_SIZE, :CHUNK_SIZE].copy()
+    doors = 2 * rng.choice(CHUNK_SIZE // 2, size=(2, CHUNK_DOORS), replace=False) + 1
+    maze[0, doors[0]] = 0
+    maze[doors[1], 0] = 0
+    items = generate_items(maze, start, None, trap_prob, HEAL_PROBABILITY, rng)
+    spawn_divine_powerups(maze, start, None, items, rng)
+    projectile_traps = generate_projectile_traps(maze, proj_chance, rng)
+    for pt in projectile_traps:
+        pt["last_shot"] = now  # don't fire everything at once when the chunk comes in
+    projectile_lanes = ProjectileLanes(maze, projectile_traps)
+    r0, c0 = cy * CHUNK_SIZE, cx * CHUNK_SIZE
+    for pt in projectile_traps:
+        pt["pos"] = (pt["pos"][0] + r0, pt["pos"][1] + c0)
+    return Chunk(cy, cx, settings, maze, items, projectile_traps, projectile_lanes)
+
+class _WorldMaze:
+    """maze[r, c] in world cells (not generated yet counts as wall)."""
+
+    def __init__(self, world):
+        self._world = world
+
+    def __getitem__(self, pos):
+        chunk, r, c = self._world.locate(*pos)
+        return 1 if chunk is None else chunk.maze[r, c]
+
+class _WorldItems:
+    """The ItemStore calls the Simulation and Renderer use, in world cells, spread over the loaded chunks."""
+
+    def __init__(self, world):
+        self._world = world
+
+    def has(self, kind, pos):
+        chunk, r, c = self._world.locate(*pos)
+        return chunk is not None and chunk.items.has(kind, (r, c))
+
+    def remove(self, kind, pos):
+        chunk, r, c = self._world.locate(*pos)
+        return chunk is not None and chunk.items.remove(kind, (r, c))
+
+    def in_rect(self, kind, r0, c0, r1, c1):
+        found = []
+        for chunk in self._world.chunks_in_rect(r0, c0, r1, c1):
+            cr, cc = chunk.origin
+            found += [(r + cr, c + cc) for r, c in chunk.items.in_rect(kind, r0 - cr, c0 - cc, r1 - cr, c1 - cc)]
+        return found
+
+class _WorldLanes:
+    """ProjectileLanes calls over all loaded chunks, in world cells."""
+
+    def __init__(self, world):
+        self._world = world
+
+    def update(self, now):
+        for chunk in self._world.loaded():
+            chunk.projectile_lanes.update(now)
+
+    def collide(self, x, y, now, size=1.0, radius=0.1):
+        hits = 0
+        for chunk in self._world.chunks_in_rect(int(math.floor(y)), int(math.floor(x)),
+                                                int(math.floor(y + size)) + 1, int(math.floor(x + size)) + 1):
+            r0, c0 = chunk.origin
+            hits += chunk.projectile_lanes.collide(x - c0, y - r0, now, size, radius)
+        return hits
+
+    def positions_in_rect(self, now, r0, c0, r1, c1):
+        found = []
+        for chunk in self._world.chunks_in_rect(r0, c0, r1, c1):
+            cr, cc = chunk.origin
+            found += [(x + cc, y + cr) for x, y in
+                      chunk.projectile_lanes.positions_in_rect(now, r0 - cr, c0 - cc, r1 - cr, c1 - cc)]
+        return found
+
+class EndlessWorld:
+    """The level of the endless mode: a maze without borders, made of chunks (see build_chunk).
+
+    Chunks within ENDLESS_LOAD_RADIUS of the player get generated when the player enters a new chunk,
+    at most max_chunks stay in memory (LRU), so memory and per-step cost don't depend on how far the
+    player went. A dropped chunk is rebuilt from its seed when it's needed again (picked up items are back).
+    It offers what the Simulation and Renderer use from a Level (maze, items, projectile_lanes,
+    projectile_traps_in_rect, settings, is_free), all in world cells; there is no exit."""
+
+    exit_cell = None
+    exit_distance = None
+    metrics = None
+    line_of_sight = None  # chunks don't have one, the renderer falls back to is_visible
+
+    def __init__(self, seed, start=(1, 1), max_chunks=ENDLESS_MAX_CHUNKS):
+        if max_chunks < (2 * ENDLESS_LOAD_RADIUS + 1) ** 2:
+            raise ValueError(f"max_chunks must hold at least the {(2 * ENDLESS_LOAD_RADIUS + 1) ** 2} chunks around the player")
+        self.seed = seed
+        self.start = self.entrance = start
+        self.max_chunks = max_chunks
+        self.score = 0
+        self.settings = get_map_settings(0)  # of the player's chunk
+        self.maze = _WorldMaze(self)
+        self.items = _WorldItems(self)
+        self.projectile_lanes = _WorldLanes(self)
+        self._chunks = OrderedDict()  # (cy, cx) -> Chunk, least recently used first
+        self._center = None
+
+    @staticmethod
+    def chunk_of(r, c):
+        return r // CHUNK_SIZE, c // CHUNK_SIZE
+
+    def loaded(self):
+        return self._chunks.values()
+
+    def locate(self, r, c):
+        """(chunk or None, local row, local col) of a world cell."""
+        return self._chunks.get((r // CHUNK_SIZE, c // CHUNK_SIZE)), r % CHUNK_SIZE, c % CHUNK_SIZE
+
+    def chunks_in_rect(self, r0, c0, r1, c1):
+        """Loaded chunks overlapping the world cells r0 <= row < r1, c0 <= col < c1."""
+        for cy in range(r0 // CHUNK_SIZE, (r1 - 1) // CHUNK_SIZE + 1):
+            for cx in range(c0 // CHUNK_SIZE, (c1 - 1) // CHUNK_SIZE + 1):
+                chunk = self._chunks.get((cy, cx))
+                if chunk is not None:
+                    yield chunk
+
+    def is_free(self, r, c):
+        chunk, r, c = self.locate(r, c)
+        return chunk is not None and chunk.maze[r, c] == 0
+
+    def projectile_traps_in_rect(self, r0, c0, r1, c1):
+        found = []
+        for chunk in self.chunks_in_rect(r0, c0, r1, c1):
+            cr, cc = chunk.origin
+            found += [chunk.projectile_traps[lane] for lane in
+                      chunk.projectile_lanes.traps_in_rect(r0 - cr, c0 - cc, r1 - cr, c1 - cc)]
+        return found
+
+    def load_around(self, cell, now=0):
+        """Makes sure the chunks around cell exist; only does work when cell is in a new chunk."""
+        center = self.chunk_of(*cell)
+        if center == self._center:
+            return
+        self._center = center
+        cy, cx = center
+        for dy in range(-ENDLESS_LOAD_RADIUS, ENDLESS_LOAD_RADIUS + 1):
+            for dx in range(-ENDLESS_LOAD_RADIUS, ENDLESS_LOAD_RADIUS + 1):
+                key = (cy + dy, cx + dx)
+                if key in self._chunks:
+                    self._chunks.move_to_end(key)
+                    continue
+                start = None
+                if self.chunk_of(*self.start) == key:
+                    start = (self.start[0] % CHUNK_SIZE, self.start[1] % CHUNK_SIZE)
+                self._chunks[key] = build_chunk(self.seed, *key, now, start)
+        self._chunks.move_to_end(center)
+        while len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        self.settings = self._chunks[center].settings
+        self.score = max(self.score, chunk_ring(cy, cx))
+
+class LineOfSight:
+    """Straight line visibility of a level (what is_visible answers), precomputed.
+
+    Every free cell gets the id of the horizontal and of the vertical run of free cells it is in.
+    Two cells in a row see each other if the cells between them are free, i.e. all in one run,
+    so visible() is a label comparison and sight_cells() the runs next to a cell plus the walls ending them."""
+
+    def __init__(self, maze):
+        self.shape = maze.shape
+        self.free = maze == 0
+        self.h_run, self.h_first, self.h_last = self._label_runs(self.free)
+        v_run, self.v_first, self.v_last = self._label_runs(self.free.T)
+        self.v_run = v_run.T
+
+    @staticmethod
+    def _label_runs(free):
+        """Run ids along the rows (-1 on walls), plus the first and last column of every run."""
+        before = np.pad(free, ((0, 0), (1, 0)), constant_values=False)[:, :-1]
+        after = np.pad(free, ((0, 0), (0, 1)), constant_values=False)[:, 1:]
+        starts = free & ~before
+        run = np.where(free, np.cumsum(starts, dtype=np.int32).reshape(free.shape) - 1, -1)
+        return run, np.nonzero(starts)[1], np.nonzero(free & ~after)[1]
+
+    def visible(self, item_pos, player_pos):
+        pr, pc = player_pos
+        ir, ic = item_pos
+        h, w = self.shape
+        if not (0 <= pr < h and 0 <= pc < w):
+            return False
+        if pr == ir:
+            if abs(ic - pc) <= 1:
+                return True
+            step = 1 if ic > pc else -1
+            label = self.h_run[pr, pc+step]
+            return label >= 0 and label == self.h_run[pr, ic-step]
+        if pc == ic:
+            if abs(ir - pr) <= 1:
+                return True
+            step = 1 if ir > pr else -1
+            label = self.v_run[pr+step, pc]
+            return label >= 0 and label == self.v_run[ir-step, pc]
+        return False
+
+    def sight_cells(self, player_pos):
+        """Set of every cell visible from player_pos (the cells item visibility gets checked against)."""
+        r, c = player_pos
+        h, w = self.shape
+        if not (0 <= r < h and 0 <= c < w):
+            return set()
+        cells = {(r, c)}
+        if c + 1 < w:
+            last = self.h_last[self.h_run[r, c+1]] + 1 if self.free[r, c+1] else c + 1
+            cells.update((r, k) for k in range(c + 1, min(last, w - 1) + 1))
+        if c > 0:
+            first = self.h_first[self.h_run[r, c-1]] - 1 if self.free[r, c-1] else c - 1
+            cells.update((r, k) for k in range(max(first, 0), c))
+        if r + 1 < h:
+            last = self.v_last[self.v_run[r+1, c]] + 1 if self.free[r+1, c] else r + 1
+            cells.update((k, c) for k in range(r + 1, min(last, h - 1) + 1))
+        if r > 0:
+            first = self.v_first[self.v_run[r-1, c]] - 1 if self.free[r-1, c] else r - 1
+            cells.update((k, c) for k in range(max(first, 0), r))
+        return cells
+
+def is_visible(item_pos, player_pos, maze):
+    pr, pc = player_pos
+    ir, ic = item_pos
+    if pr == ir:
+        step = 1 if ic > pc else -1
+        for c in range(pc+step, ic, step):
+            if maze[pr, c] == 1:
+                return False
+        return True
+    elif pc == ic:
+        step = 1 if ir > pr else -1
+        for r in range(pr+step, ir, step):
+            if maze[r, pc] == 1:
+                return False
+        return True
+    else:
+        return False
+
+# Simulation
+
+DIVINE_ANIM_DURATION = 5000  # ms the Divine Eyes orb needs to fly along the path
+MOVES = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+@dataclass
+class Input:
+    """What the player does during one step."""
+    move: tuple = None             # (dr, dc) of the held direction, see MOVES
+    activate_divine: bool = False  # use a Divine Eyes
+
+@dataclass
+class GameState:
+    level: Level
+    score: int = 0
+    health: int = PLAYER_START_HEALTH
+    time: int = 0                  # ms since the run started
+    player_grid: list = None       # [row, col]
+    player_pos: list = None        # [x, y] in cells (top left corner of the player)
+    is_animating: bool = False     # moving from player_grid to target_grid
+    anim_start_time: int = 0
+    start_pos: list = None
+    target_grid: list = None
+    last_damaged_position: tuple = None
+    divine_inventory: int = 0
+    divine_state: str = None       # None, "animating" or "sustain"
+    divine_path: list = field(default_factory=list)  # grid positions from the player to the exit
+    divine_arc: ArcLengthPath = None  # divine_path as activated, for the orb animation
+    divine_path_from: tuple = None # player cell divine_path was computed from (only recomputed when it changes)
+    divine_anim_progress: float = 0.0
+    no_collision: bool = False
+    game_over: bool = False
+
+class Simulation:
+    """Runs the game rules on a GameState, step by step, without any display.
+
+    step() returns what happened as events (tuples, kind first):
+    ("trap", damage, crit), ("heal", amount), ("divine_pickup",), ("divine_activated",),
+    ("projectile_hit", damage), ("level_complete", score) and ("game_over", score).
+    Every run has a seed (a new one if none is given), the level for a score is built from
+    level_seed(seed, score), so a run can be replayed with Simulation(seed=sim.seed).
+    With a level_pack (levelpack.LevelPack) the levels it holds are loaded from it instead of generated.
+    difficulty_band (min, max) makes generated levels stay within that MazeMetrics.difficulty (see build_level),
+    algorithm picks the maze generator of generated levels (one of MAZE_ALGORITHMS).
+    With advance=False reaching the exit ends the run (finished, step() does nothing anymore) instead of
+    building the next level, for playing single levels."""
+
+    def __init__(self, seed=None, score=0, prefetch=False, level_pack=None, difficulty_band=None, advance=True,
+                 algorithm="backtracker"):
+        self.seed = seed if seed is not None else new_run_seed()
+        self.advance = advance
+        self.finished = False
+        self._random = random.Random(self.seed)  # trap crits
+        self.difficulty_band = difficulty_band
+        self.algorithm = algorithm
+        self._prefetcher = LevelPrefetcher(difficulty_band, algorithm, level_pack) if prefetch else None
+        self.level_pack = level_pack
+        self.state = GameState(level=None, score=score, health=PLAYER_START_HEALTH)
+        self._start_level(self._build_level(score))
+
+    def level_seed(self, score):
+        return level_seed(self.seed, score)
+
+    def _build_level(self, score):
+        if self._prefetcher is not None:
+            return self._prefetcher.take(score, self.level_seed(score))
+        if self.level_pack is not None and score in self.level_pack:
+            return self.level_pack.level_for(score)
+        return build_level(score, self.level_seed(score), self.difficulty_band, self.algorithm)
+
+    def _start_level(self, level):
+        st = self.state
+        st.level = level
+        st.player_grid = list(level.entrance)
+        st.player_pos = [float(level.entrance[1]), float(level.entrance[0])]
+        st.is_animating = False
+        st.last_damaged_position = None
+        st.divine_state = None
+        if self._prefetcher is not None:
+            self._prefetcher.request(level.score + 1, self.level_seed(level.score + 1))
+
+    def next_level(self):
+        self.state.score += 1
+        self._start_level(self._build_level(self.state.score))
+
+    def add_health(self, amount):
+        self.state.health += amount
+
+    def add_divine_eye(self):
+        if self.state.divine_inventory < MAX_DIVINE_EYES:
+            self.state.divine_inventory += 1
+            return True
+        return False
+
+    def activate_divine(self):
+        st = self.state
+        if st.divine_state is None and st.divine_inventory > 0:
+            path = path_from_distance_field(st.level.exit_distance, tuple(st.player_grid))
+            if path:
+                st.divine_inventory -= 1
+                st.divine_state = "animating"
+                st.divine_anim_progress = 0.0
+                st.divine_path = path
+                st.divine_arc = ArcLengthPath(path)
+                st.divine_path_from = tuple(st.player_grid)
+                return True
+        return False
+
+    def step(self, inp, dt):
+        """Advances the game by dt ms."""
+        st = self.state
+        events = []
+        if st.game_over or self.finished:
+            return events
+        st.time += dt
+        now = st.time
+        if inp.activate_divine and self.activate_divine():
+            events.append(("divine_activated",))
+
+        if not st.is_animating and inp.move is not None:
+            new_grid = [st.player_grid[0] + inp.move[0], st.player_grid[1] + inp.move[1]]
+            if st.no_collision or st.level.is_free(*new_grid):
+                st.is_animating = True
+                st.anim_start_time = now
+                st.start_pos = st.player_pos[:]
+                st.target_grid = new_grid
+        if st.is_animating:
+            t = (now - st.anim_start_time) / ANIM_DURATION
+            if t >= 1:
+                t = 1
+                st.is_animating = False
+                st.player_grid = st.target_grid[:]
+            st.player_pos[0] = st.start_pos[0] + (st.target_grid[1]-st.start_pos[0])*t
+            st.player_pos[1] = st.start_pos[1] + (st.target_grid[0]-st.start_pos[1])*t
+
+        # collision checks
+        if not st.is_animating and not st.no_collision:
+            items = st.level.items
+            cell = tuple(st.player_grid)
+            if items.has(ITEM_TRAP, cell):
+                if st.last_damaged_position != cell:
+                    crit = self._random.random() < st.level.settings[3]
+                    damage = TRAP_DAMAGE + (int(0.25 * st.health) if crit else 0)
+                    st.health -= damage
+                    events.append(("trap", damage, crit))
+                    st.last_damaged_position = cell
+            else:
+                st.last_damaged_position = None
+            if items.has(ITEM_HEAL, cell):
+                old_health = st.health
+                st.health = int(st.health + st.health * 0.5)
+                events.append(("heal", st.health - old_health))
+                items.remove(ITEM_HEAL, cell)
+            if items.has(ITEM_DIVINE, cell):
+                if self.add_divine_eye():
+                    events.append(("divine_pickup",))
+                items.remove(ITEM_DIVINE, cell)
+
+        # exit check
+        if not st.is_animating and tuple(st.player_grid) == st.level.exit_cell:
+            if not self.advance:
+                self.finished = True
+                events.append(("level_complete", st.score + 1))
+                return events
+            self.next_level()
+            events.append(("level_complete", st.score))
+
+        # Divine Eyes: fly the orb along the path, then keep the path up to date
+        if st.divine_state == "animating":
+            st.divine_anim_progress += dt / DIVINE_ANIM_DURATION
+            if st.divine_anim_progress >= 1.0:
+                st.divine_anim_progress = 1.0
+                st.divine_state = "sustain"
+        elif st.divine_state == "sustain":
+            # From an unreachable cell (e.g. noCollision inside a wall) the last path is kept.
+            if st.divine_path_from != tuple(st.player_grid):
+                st.divine_path_from = tuple(st.player_grid)
+                new_path = path_from_distance_field(st.level.exit_distance, st.divine_path_from)
+                if new_path:
+                    st.divine_path = new_path
+
+        # projectiles (fired and moved by the lanes, only lanes crossing the player are checked)
+        lanes = st.level.projectile_lanes
+        lanes.update(now)
+        for _ in range(lanes.collide(st.player_pos[0], st.player_pos[1], now)):
+            st.health -= TRAP_DAMAGE
+            events.append(("projectile_hit", TRAP_DAMAGE))
+
+        if st.health <= 0:
+            st.game_over = True
+            events.append(("game_over", st.score))
+        return events
+
+    def close(self):
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown()
+
+class EndlessSimulation(Simulation):
+    """The Simulation on an EndlessWorld: no exit and no levels, the score is the furthest chunk ring
+       the player reached ("level_complete" is sent for every new ring). Divine Eyes have no exit to
+       point to, so they can be collected but not activated."""
+
+    def __init__(self, seed=None, max_chunks=ENDLESS_MAX_CHUNKS):
+        self.max_chunks = max_chunks
+        super().__init__(seed)
+        world = self.state.level
+        world.load_around(world.start)
+
+    def _build_level(self, score):
+        return EndlessWorld(self.seed, max_chunks=self.max_chunks)
+
+    def _enter(self, cell, events):
+        world = self.state.level
+        world.load_around(cell, self.state.time)
+        if world.score > self.state.score:
+            self.state.score = world.score
+            events.append(("level_complete", world.score))
+
+    def next_level(self):
+        # cheat: skip one chunk to the right (onto a cell on the odd lattice, those are always free)
+        st = self.state
+        r, c = st.player_grid
+        st.player_grid = [r | 1, (c + CHUNK_SIZE) | 1]
+        st.player_pos = [float(st.player_grid[1]), float(st.player_grid[0])]
+        st.is_animating = False
+        self._enter(st.player_grid, [])
+
+    def activate_divine(self):
+        return False
+
+    def step(self, inp, dt):
+        events = super().step(inp, dt)
+        self._enter(self.state.player_grid, events)
+        return events
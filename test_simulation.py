@@ -0,0 +1,102 @@
+"""Tests for the pygame-free game logic (python -m pytest)."""
+import numpy as np
+import pytest
+
+import bots
+import levelpack
+import simulation as sim
+
+
+def scalar_projectile_trap_cells(maze):
+    """The original per-cell loop: (row, col) -> direction of every projectile trap candidate."""
+    h, w = maze.shape
+    found = {}
+    for r in range(1, h-1):
+        for c in range(1, w-1):
+            if maze[r, c] == 1:
+                for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
+                    nr, nc = r+dr, c+dc
+                    if 0 <= nr < h and 0 <= nc < w and maze[nr, nc] == 0:
+                        nr2, nc2 = r+2*dr, c+2*dc
+                        if 0 <= nr2 < h and 0 <= nc2 < w and maze[nr2, nc2] == 0:
+                            found[(r, c)] = (dr, dc)
+                            break
+    return found
+
+
+@pytest.mark.parametrize("algorithm", list(sim.MAZE_ALGORITHMS))
+@pytest.mark.parametrize("size", [sim.SMALL_MAZE_SIZE, sim.MEDIUM_MAZE_SIZE, sim.BOSS_MAZE_SIZE])
+def test_projectile_trap_candidates_match_scalar_loop(size, algorithm):
+    rng = np.random.default_rng(size)
+    maze = sim.generate_maze(size, size, algorithm, rng)
+    sim.add_entrance_exit(maze, rng)
+    traps = sim.generate_projectile_traps(maze, 1.0, rng)  # proj_chance 1: every candidate gets a trap
+    assert {pt["pos"]: pt["dir"] for pt in traps} == scalar_projectile_trap_cells(maze)
+
+
+def run_events(seed, steps=3000, dt=16):
+    """Every event of a run driven by the greedy bot (activating Divine Eyes whenever it can)."""
+    simulation = sim.Simulation(seed=seed)
+    bot = bots.GreedyBot()
+    events = []
+    for _ in range(steps):
+        inp = bot.act(simulation.state)
+        inp.activate_divine = True
+        events.append(simulation.step(inp, dt))
+    st = simulation.state
+    simulation.close()
+    return events, (st.score, st.health, st.time, st.player_grid)
+
+
+def test_same_seed_gives_the_same_events():
+    events, final = run_events(7)
+    assert any(e[0] == "level_complete" for step in events for e in step)  # it got past at least one level
+    assert run_events(7) == (events, final)
+    assert run_events(8) != (events, final)
+
+
+@pytest.mark.parametrize("score", [0, 2, 5])
+def test_line_of_sight_matches_is_visible(score):
+    level = sim.build_level(score, (3, score))
+    maze = level.maze
+    h, w = maze.shape
+    los = sim.LineOfSight(maze)
+    for pr, pc in zip(*np.nonzero(maze == 0)):
+        player = (int(pr), int(pc))
+        seen = {(player[0], c) for c in range(w) if sim.is_visible((player[0], c), player, maze)}
+        seen |= {(r, player[1]) for r in range(h) if sim.is_visible((r, player[1]), player, maze)}
+        assert los.sight_cells(player) == seen
+        for r, c in [(player[0], c) for c in range(w)] + [(r, player[1]) for r in range(h)]:
+            assert los.visible((r, c), player) == sim.is_visible((r, c), player, maze)
+
+
+def test_level_pack_round_trip(tmp_path):
+    levels = [sim.build_level(score, (11, score)) for score in range(7)]
+    path = tmp_path / "levels.mzp"
+    assert levelpack.write_level_pack(path, levels) == len(levels)
+    with levelpack.LevelPack(path) as pack:
+        assert len(pack) == len(levels) and 7 not in pack and pack.level_for(7) is None
+        for level in levels:
+            loaded = pack.level_for(level.score)
+            assert loaded.score == level.score and loaded.settings == level.settings
+            assert np.array_equal(loaded.maze, level.maze)
+            assert (loaded.entrance, loaded.exit_cell) == (level.entrance, level.exit_cell)
+            for kind in (sim.ITEM_TRAP, sim.ITEM_HEAL, sim.ITEM_DIVINE):
+                assert sorted(loaded.items.positions(kind)) == sorted(level.items.positions(kind))
+            assert np.array_equal(loaded.items.grid, level.items.grid)
+            assert loaded.projectile_traps == level.projectile_traps
+            assert np.array_equal(loaded.exit_distance, level.exit_distance)
+            assert loaded.metrics == level.metrics
+
+
+def test_prefetching_simulation_loads_pack_levels(tmp_path):
+    levels = [sim.build_level(score, (11, score), algorithm="kruskal") for score in range(3)]
+    path = tmp_path / "levels.mzp"
+    levelpack.write_level_pack(path, levels)
+    with levelpack.LevelPack(path) as pack:
+        simulation = sim.Simulation(seed=5, prefetch=True, level_pack=pack)
+        for level in levels + [sim.build_level(3, (5, 3))]:  # score 3 isn't in the pack: generated
+            assert simulation.state.score == level.score
+            assert np.array_equal(simulation.state.level.maze, level.maze)
+            simulation.next_level()
+        simulation.close()